@@ -1,18 +1,21 @@
 from __future__ import annotations
 
 import asyncio
+import atexit
 import contextlib
 import inspect
 import json
 import logging
 import os
+import queue
 import threading
 import time
 from collections import deque
 from dataclasses import dataclass
 from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
 from pathlib import Path
-from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Sequence, Tuple, Type
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Sequence, Set, Tuple, Type
 
 from livekit.agents import Agent, RunContext, function_tool
 from rich.console import Console
@@ -30,9 +33,19 @@ from tools.session_tools import SessionManagementToolsMixin
 TaskRecord = Dict[str, Any]
 SESSION_LOG_PATH: Path | None = None
 _LOGGING_CONFIGURED = False
+_LOG_LISTENER: QueueListener | None = None
 _CONSOLE = Console()
 
 
+class _InProcessQueueHandler(QueueHandler):
+    """Queue handler that passes records through untouched so the listener formats them."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Records never leave the process, so skip the eager formatting/pickling prep and keep
+        # exc_info intact for Rich tracebacks.
+        return record
+
+
 class _ConsoleRawLogFilter(logging.Filter):
     """Filter that suppresses console records coming from non-application loggers."""
 
@@ -51,9 +64,20 @@ class _ConsoleRawLogFilter(logging.Filter):
         return any(name.startswith(prefix) for prefix in self._ALLOWED_PREFIXES)
 
 
+def _stop_log_listener() -> None:
+    """Flush queued log records and stop the background logging thread."""
+    global _LOG_LISTENER
+    listener, _LOG_LISTENER = _LOG_LISTENER, None
+    if listener is not None:
+        listener.stop()
+
+
+atexit.register(_stop_log_listener)
+
+
 def _configure_beautified_logging() -> logging.Logger:
     """Configure Rich-backed console logging and raw session file logging."""
-    global SESSION_LOG_PATH, _LOGGING_CONFIGURED
+    global SESSION_LOG_PATH, _LOGGING_CONFIGURED, _LOG_LISTENER
 
     root_logger = logging.getLogger()
     if _LOGGING_CONFIGURED and SESSION_LOG_PATH and root_logger.handlers:
@@ -87,9 +111,15 @@ def _configure_beautified_logging() -> logging.Logger:
 
     for handler in list(root_logger.handlers):
         root_logger.removeHandler(handler)
+    _stop_log_listener()
+
+    # Callers only enqueue records; console rendering and file writes happen on the listener thread.
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    _LOG_LISTENER = QueueListener(log_queue, console_handler, file_handler, respect_handler_level=True)
+    _LOG_LISTENER.start()
+
     root_logger.setLevel(logging.DEBUG)
-    root_logger.addHandler(console_handler)
-    root_logger.addHandler(file_handler)
+    root_logger.addHandler(_InProcessQueueHandler(log_queue))
 
     _LOGGING_CONFIGURED = True
 
@@ -107,6 +137,35 @@ APPLICATION_LOGGER = _configure_beautified_logging()
 logger = logging.getLogger("head-belya")
 logger.setLevel(logging.DEBUG)
 
+_HEAD_INSTRUCTIONS = (
+    "Your name is Belya. You are a helpful voice assistant for Codex users. Your interface with users will be Voice. "
+    "You help users in the following: "
+    "1. collecting all the coding tasks they need from Codex to work on. Make sure you have all the needed work before sending it to Codex CLI. "
+    "2. creating a single prompt for all the coding requests from the user to communicate to Codex. "
+    "3. Get the code response, once Codex finish the task. "
+    "4. reading out the code response to the user via voice; focusing on the task actions done and the list of tests communicated back from Codex. Do not read the diffs. "
+    "You also have git control over the git repository you are working on. "
+    "Ask the user if they have any more tasks to send to Codex, and repeat the process until the user is done. "
+    "After their first task, ask them if they want to continue with the task or start a new one. use the 'start_a_new_session' function if they chose to start a new codex task. "
+    "Any new session should have a different id than previous sessions. "
+    "review the prompt with the user before sending it to the 'send_task_to_Codex' function. "
+    "Always use the `send_task_to_Codex` tool to send any coding task to Codex CLI. "
+    "Let the user know that Codex can optionally use a web search feature to help with tasks; confirm whether they want it enabled before toggling it on. Use the Codex session configuration tool to update this setting. "
+    "Make sure you notify the user of the current branch before they start a new session/task. use the 'check_current_branch' to get the current branch. "
+    "Ask the user if he wants to create a new branch and if the user approve, start a new branch in the repo before sending new tasks to Codex CLI. "
+    "Do not change the branch mid-session. "
+    "Ask the user if they have a preference for the branch name, and verify the branch name. use the 'create branch' tool. "
+    "Never try to do any coding task by yourself. Do not ask the user to provide any code. "
+    "Always wait for the Codex response before reading it out to the user. "
+    "Be polite and professional. Sound excited to help the user. "
+    "Coordinate codex-belya for coding tasks, git-belya for git operations, and rag-belya for repository research; do not execute those tasks yourself."
+)
+
+_LIVEKIT_CONTEXT_KEYS = (
+    ("room_id", "room_sid", "room_name"),
+    ("participant_id", "participant_sid", "participant_identity"),
+)
+
 
 class TaskRepository:
     """Caches and indexes Codex tasks stored in a ``tasks.json`` file."""
@@ -444,6 +503,7 @@ class HeadBelyaAgent(AgentUtilitiesMixin, SessionManagementToolsMixin, Agent):
         self.git_agent = GitBelyaAgent()
         self.rag_agent = RAGBelyaAgent()
         self.CodexAgent = self.codex_agent.CodexAgent
+        self._cached_session_id: Optional[str] = self.codex_agent.current_session_id()
         self._sub_agents: Dict[str, Agent] = {
             "codex-belya": self.codex_agent,
             "git-belya": self.git_agent,
@@ -452,6 +512,8 @@ class HeadBelyaAgent(AgentUtilitiesMixin, SessionManagementToolsMixin, Agent):
         self.agent_tool_catalog: Dict[str, List[Dict[str, str]]] = {}
         self.task_manager = TaskManager()
         self._background_tasks: Dict[str, asyncio.Task[Any]] = {}
+        self._post_process_tasks: Set[asyncio.Task[Optional[str]]] = set()
+        self._session_locks: Dict[str, asyncio.Lock] = {}
         tasks_file_path = self.task_manager.tasks_file
         resolved_tasks_path = (
             tasks_file_path.resolve()
@@ -468,39 +530,21 @@ class HeadBelyaAgent(AgentUtilitiesMixin, SessionManagementToolsMixin, Agent):
         self._pending_completion_events: Deque[TaskCompletionEvent] = deque()
         self._asyncio_loop: asyncio.AbstractEventLoop | None = None
 
-        self.sessions_ids_used = [
-            record.session_id for record in self.session_store.list_sessions()
-        ]
-        self.utilization_warning_thresholds: Tuple[int, int, int] = (80, 90, 95)
+        self.sessions_ids_used: Set[str] = set(self.session_store.iter_session_ids())
+        # Ascending; _compute_new_warnings relies on the order.
+        self.utilization_warning_thresholds: Tuple[int, ...] = (80, 90, 95)
         self.available_approval_policies: Tuple[str, ...] = ("never", "on-request", "on-failure", "untrusted")
         self.available_models: Tuple[str, ...] = ("gpt-5-codex", "gpt-5", "gpt-4.1", "gpt-4.1-mini", "gpt-4o", "gpt-4o-mini")
+        self._policy_options_str = ", ".join(self.available_approval_policies)
+        self._model_options_str = ", ".join(self.available_models)
         self.session_settings_cache: Dict[str, Dict[str, Any]] = {}
-        self.rate_limit_warning_cache: Dict[str, Dict[str, List[int]]] = {}
+        self._last_synced_settings: Optional[Dict[str, Any]] = None
+        self.rate_limit_warning_cache: Dict[str, Dict[str, Set[int]]] = {}
+        self.session_metrics_cache: Dict[str, Tuple[int, Dict[str, Any]]] = {}
         self.livekit_state: Dict[str, Any] = self._load_livekit_state()
+        self._livekit_state_dirty = False
         super().__init__(
-            instructions=(
-                "Your name is Belya. You are a helpful voice assistant for Codex users. Your interface with users will be Voice. "
-                "You help users in the following: "
-                "1. collecting all the coding tasks they need from Codex to work on. Make sure you have all the needed work before sending it to Codex CLI. "
-                "2. creating a single prompt for all the coding requests from the user to communicate to Codex. "
-                "3. Get the code response, once Codex finish the task. "
-                "4. reading out the code response to the user via voice; focusing on the task actions done and the list of tests communicated back from Codex. Do not read the diffs. "
-                "You also have git control over the git repository you are working on. "
-                "Ask the user if they have any more tasks to send to Codex, and repeat the process until the user is done. "
-                "After their first task, ask them if they want to continue with the task or start a new one. use the 'start_a_new_session' function if they chose to start a new codex task. "
-                "Any new session should have a different id than previous sessions. "
-                "review the prompt with the user before sending it to the 'send_task_to_Codex' function. "
-                "Always use the `send_task_to_Codex` tool to send any coding task to Codex CLI. "
-                "Let the user know that Codex can optionally use a web search feature to help with tasks; confirm whether they want it enabled before toggling it on. Use the Codex session configuration tool to update this setting. "
-                "Make sure you notify the user of the current branch before they start a new session/task. use the 'check_current_branch' to get the current branch. "
-                "Ask the user if he wants to create a new branch and if the user approve, start a new branch in the repo before sending new tasks to Codex CLI. "
-                "Do not change the branch mid-session. "
-                "Ask the user if they have a preference for the branch name, and verify the branch name. use the 'create branch' tool. "
-                "Never try to do any coding task by yourself. Do not ask the user to provide any code. "
-                "Always wait for the Codex response before reading it out to the user. "
-                "Be polite and professional. Sound excited to help the user. "
-                "Coordinate codex-belya for coding tasks, git-belya for git operations, and rag-belya for repository research; do not execute those tasks yourself."
-            ),
+            instructions=_HEAD_INSTRUCTIONS,
         )
         self._register_current_session()
         self._agent_aliases = self._build_agent_alias_map()
@@ -649,12 +693,13 @@ class HeadBelyaAgent(AgentUtilitiesMixin, SessionManagementToolsMixin, Agent):
         )
 
         instructions = " ".join(message_parts)
-        logger.info(
-            "Notifying user about completion of tasks: %s",
-            ", ".join(
-                f"{entry['task_id']} ({entry['status']})" for entry in summaries
-            ),
-        )
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(
+                "Notifying user about completion of tasks: %s",
+                ", ".join(
+                    f"{entry['task_id']} ({entry['status']})" for entry in summaries
+                ),
+            )
         self.session.generate_reply(instructions=instructions)
 
     @function_tool
@@ -907,6 +952,7 @@ class HeadBelyaAgent(AgentUtilitiesMixin, SessionManagementToolsMixin, Agent):
 
     async def _run_codex_task(self, task_id: str, task_prompt: str) -> None:
         """Execute the Codex directive and update task state."""
+        session_id = self._current_session_id()
         try:
             result: CodexTaskResult = await self.codex_agent.execute_directive(task_prompt)
             error_message = result.get("error")
@@ -935,11 +981,12 @@ class HeadBelyaAgent(AgentUtilitiesMixin, SessionManagementToolsMixin, Agent):
                 result=output_text,
                 metadata_update=metadata_update,
             )
-            warning_message = self._post_process_codex_activity(
+            warning_message = await self._post_process_in_background(
+                session_id,
                 task_prompt,
                 output_text,
                 raw_result,
-                entry_type="task",
+                "task",
             )
             if warning_message:
                 self.task_manager.append_task_note(task_id, warning_message)
@@ -1013,7 +1060,7 @@ class HeadBelyaAgent(AgentUtilitiesMixin, SessionManagementToolsMixin, Agent):
         """Best-effort attempt to read the current git branch."""
         try:
             repo = self.git_agent._repo()
-            return repo.active_branch.name
+            return self.git_agent._active_branch_name(repo)
         except Exception as error:
             logger.warning("Unable to determine current branch: %s", error)
             return None
@@ -1032,23 +1079,13 @@ class HeadBelyaAgent(AgentUtilitiesMixin, SessionManagementToolsMixin, Agent):
             logger.exception("Failed to register session %s: %s", session_id, error)
             record = None
         else:
-            if session_id not in self.sessions_ids_used:
-                self.sessions_ids_used.append(session_id)
+            self.sessions_ids_used.add(session_id)
         if record:
             settings = record.metadata.get("settings", {})
             normalized_settings = settings if isinstance(settings, dict) else {}
             self.session_settings_cache[session_id] = normalized_settings
             self._sync_codex_settings(normalized_settings)
-            warnings = (
-                record.metadata.get("metrics", {})
-                .get("token_usage", {})
-                .get("warnings", {})
-            )
-            if isinstance(warnings, dict):
-                self.rate_limit_warning_cache[session_id] = {
-                    "five_hour": list(warnings.get("five_hour", [])),
-                    "weekly": list(warnings.get("weekly", [])),
-                }
+            self.rate_limit_warning_cache[session_id] = self._warning_levels_from_record(record)
 
     def _update_current_session_branch(self, branch_name: str | None) -> None:
         """Persist the branch name for the active session."""
@@ -1077,12 +1114,14 @@ class HeadBelyaAgent(AgentUtilitiesMixin, SessionManagementToolsMixin, Agent):
             update_kwargs["model"] = settings.get("model")
         if "web_search_enabled" in settings:
             update_kwargs["web_search_enabled"] = settings.get("web_search_enabled")
-        if not update_kwargs:
+        if not update_kwargs or update_kwargs == self._last_synced_settings:
             return
         try:
             self.codex_agent.update_settings(**update_kwargs)
         except Exception as error:
             logger.exception("Failed to sync Codex settings %s: %s", update_kwargs, error)
+        else:
+            self._last_synced_settings = update_kwargs
 
     def _get_session_record(self, session_id: Optional[str] = None) -> Optional[SessionRecord]:
         """Fetch a session record, defaulting to the active session."""
@@ -1096,7 +1135,12 @@ class HeadBelyaAgent(AgentUtilitiesMixin, SessionManagementToolsMixin, Agent):
             return None
 
     def _current_session_id(self) -> Optional[str]:
-        return self.codex_agent.current_session_id()
+        return self._cached_session_id
+
+    def _refresh_session_id(self) -> Optional[str]:
+        """Re-read the active session id after the Codex session was replaced or renamed."""
+        self._cached_session_id = self.codex_agent.current_session_id()
+        return self._cached_session_id
 
     def _load_livekit_state(self) -> Dict[str, Any]:
         logger.debug("LiveKit state persistence is currently disabled; starting with an empty state.")
@@ -1105,6 +1149,13 @@ class HeadBelyaAgent(AgentUtilitiesMixin, SessionManagementToolsMixin, Agent):
     def _persist_livekit_state(self) -> None:
         logger.debug("LiveKit state persistence is disabled; skipping persistence request.")
 
+    def _flush_livekit_state(self) -> None:
+        """Persist the LiveKit context once if it changed since the last flush."""
+        if not self._livekit_state_dirty:
+            return
+        self._livekit_state_dirty = False
+        self._persist_livekit_state()
+
     def get_livekit_state(self) -> Dict[str, Any]:
         return dict(self.livekit_state)
 
@@ -1113,25 +1164,18 @@ class HeadBelyaAgent(AgentUtilitiesMixin, SessionManagementToolsMixin, Agent):
         room_info: Optional[Dict[str, Any]] = None,
         participant_info: Optional[Dict[str, Any]] = None,
     ) -> None:
-        state_changed = False
-
-        if room_info:
-            for key in ("room_id", "room_sid", "room_name"):
-                value = room_info.get(key)
-                if value and self.livekit_state.get(key) != value:
-                    self.livekit_state[key] = value
-                    state_changed = True
-
-        if participant_info:
-            for key in ("participant_id", "participant_sid", "participant_identity"):
-                value = participant_info.get(key)
-                if value and self.livekit_state.get(key) != value:
-                    self.livekit_state[key] = value
-                    state_changed = True
-
-        if state_changed:
+        changes: Dict[str, Any] = {}
+        for info, keys in zip((room_info, participant_info), _LIVEKIT_CONTEXT_KEYS):
+            # Empty snapshots and ones already reflected in the state cannot change anything.
+            if info and any(info.values()) and not info.items() <= self.livekit_state.items():
+                changes.update(
+                    (key, info[key]) for key in keys if info.get(key) and self.livekit_state.get(key) != info[key]
+                )
+
+        if changes:
+            self.livekit_state.update(changes)
             self.livekit_state["updated_at"] = self._current_time_iso()
-            self._persist_livekit_state()
+            self._livekit_state_dirty = True
             logger.info(
                 "Updated in-memory LiveKit context: room=%s participant=%s",
                 self.livekit_state.get("room_sid") or self.livekit_state.get("room_name"),
@@ -1139,13 +1183,66 @@ class HeadBelyaAgent(AgentUtilitiesMixin, SessionManagementToolsMixin, Agent):
             )
 
     async def _execute_codex_directive(self, directive: str, entry_type: str = "directive") -> str:
+        # The turn belongs to the session the directive was sent from, even if it is switched meanwhile.
+        session_id = self._current_session_id()
         result = await self.codex_agent.execute_directive(directive)
         output_text = result.get("output") or ""
-        warning_message = self._post_process_codex_activity(directive, output_text, result.get("raw_result"), entry_type=entry_type)
-        if warning_message:
-            return f"{output_text}\n\n{warning_message}"
+        post_process_task = asyncio.create_task(
+            self._post_process_in_background(session_id, directive, output_text, result.get("raw_result"), entry_type)
+        )
+        self._post_process_tasks.add(post_process_task)
+        post_process_task.add_done_callback(self._handle_post_process_completion)
         return output_text
 
+    async def _post_process_in_background(
+        self,
+        session_id: Optional[str],
+        prompt: str,
+        output_text: str,
+        raw_result: Any,
+        entry_type: str,
+    ) -> Optional[str]:
+        """Record a directive's metrics off the reply path, one turn per session at a time."""
+        if not session_id:
+            return None
+        async with self._session_lock(session_id):
+            return await self._post_process_codex_activity(
+                session_id,
+                prompt,
+                output_text,
+                raw_result,
+                entry_type,
+            )
+
+    def _session_lock(self, session_id: str) -> asyncio.Lock:
+        session_lock = self._session_locks.get(session_id)
+        if session_lock is None:
+            session_lock = self._session_locks[session_id] = asyncio.Lock()
+        return session_lock
+
+    async def _store_write(self, session_id: Optional[str], write: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Run a blocking session-store write in a worker thread, serialized per session."""
+        async with self._session_lock(session_id or ""):
+            return await asyncio.to_thread(write, *args, **kwargs)
+
+    def _handle_post_process_completion(self, post_process_task: asyncio.Task[Optional[str]]) -> None:
+        """Surface usage warnings once a directive's background bookkeeping finishes."""
+        self._post_process_tasks.discard(post_process_task)
+        if post_process_task.cancelled():
+            return
+        exception = post_process_task.exception()
+        if exception:
+            logger.error(
+                "Post-processing of a Codex directive raised an exception",
+                exc_info=(exception.__class__, exception, exception.__traceback__),
+            )
+            return
+        warning_message = post_process_task.result()
+        if warning_message:
+            self.session.generate_reply(
+                instructions=f"Briefly let the user know about this Codex usage warning: {warning_message}"
+            )
+
     @function_tool
     async def research_repository(self, question: str, run_ctx: RunContext, max_snippets: int = 5) -> str:
         """Delegate repository research to rag-belya."""
@@ -1161,6 +1258,10 @@ class HeadBelyaAgent(AgentUtilitiesMixin, SessionManagementToolsMixin, Agent):
     async def on_exit(self) -> None:
         if self._task_watcher:
             self._task_watcher.stop()
+        if self._post_process_tasks:
+            await asyncio.gather(*self._post_process_tasks, return_exceptions=True)
+        self._flush_livekit_state()
+        await self.CodexAgent.aclose()
         if self._completion_processor:
             self._completion_processor.cancel()
             with contextlib.suppress(asyncio.CancelledError):
@@ -1,9 +1,31 @@
+import functools
 import logging
-from datetime import datetime
-from typing import Any
+import time
+from typing import Any, Awaitable, Callable, TypeVar
 
 from git.exc import GitCommandError
 
+_ToolFn = TypeVar("_ToolFn", bound=Callable[..., Awaitable[Any]])
+
+# Result attributes that may carry Codex's final text, in order of preference.
+_OUTPUT_ATTRS = ("final_output", "output")
+
+
+def handle_tool_errors(action: str) -> Callable[[_ToolFn], _ToolFn]:
+    """Wrap an async tool so any exception is reported through ``_handle_tool_error``."""
+
+    def decorator(tool_fn: _ToolFn) -> _ToolFn:
+        @functools.wraps(tool_fn)
+        async def wrapper(self, *args: Any, **kwargs: Any) -> Any:
+            try:
+                return await tool_fn(self, *args, **kwargs)
+            except Exception as error:
+                return self._handle_tool_error(action, error)
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorator
+
 
 class AgentUtilitiesMixin:
     """Shared utilities for Belya agents to keep behavior consistent across roles."""
@@ -11,15 +33,18 @@ class AgentUtilitiesMixin:
     _logger = logging.getLogger("belya-agents")
 
     def _current_time_iso(self) -> str:
-        return datetime.utcnow().replace(microsecond=0).isoformat() + "Z"
+        """Return the current UTC time at second precision, formatting at most once per second."""
+        now = int(time.time())
+        cached_second, cached_iso = getattr(self, "_iso_cache", (None, ""))
+        if cached_second == now:
+            return cached_iso
+        formatted = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(now))
+        setattr(self, "_iso_cache", (now, formatted))
+        return formatted
 
     def _extract_final_output(self, codex_result: Any, fallback_prompt: str = "") -> str:
-        if hasattr(codex_result, "final_output"):
-            candidate = getattr(codex_result, "final_output")
-            if isinstance(candidate, str):
-                return candidate
-        if hasattr(codex_result, "output"):
-            candidate = getattr(codex_result, "output")
+        for attr in _OUTPUT_ATTRS:
+            candidate = getattr(codex_result, attr, None)
             if isinstance(candidate, str):
                 return candidate
         if isinstance(codex_result, str):
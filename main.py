@@ -1,4 +1,7 @@
+import asyncio
+import functools
 import logging
+from typing import Any, Dict
 
 from dotenv import load_dotenv
 from livekit.agents import (
@@ -20,12 +23,60 @@ logger = logging.getLogger("basic-agent")
 
 load_dotenv()
 
+try:
+    import uvloop
+except ImportError:  # pragma: no cover - uvloop is an optional speed-up
+    uvloop = None
+else:
+    # Worker processes re-import this module, so each job loop is created by uvloop.
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+
+_TTS_INSTRUCTIONS = (
+    "Use a friendly and professional tone of voice. Be cheerful and encouraging. "
+    "Sound excited to help the user."
+)
+
+_PARTICIPANT_HINT_ATTRS = ("identity", "participant_identity")
+
+
+def _participant_hint_attr(options_type: type):
+    """Return the field an options class uses for the participant identity, if any."""
+    fields = getattr(options_type, "__dataclass_fields__", {})
+    return next(
+        (attr for attr in _PARTICIPANT_HINT_ATTRS if attr in fields or hasattr(options_type, attr)),
+        None,
+    )
+
+
+_INPUT_HINT_ATTR = _participant_hint_attr(RoomInputOptions)
+_OUTPUT_HINT_ATTR = _participant_hint_attr(RoomOutputOptions)
+
+
+def _snapshot(obj: Any, *attrs: str) -> Dict[str, Any]:
+    return {attr: getattr(obj, attr, None) for attr in attrs}
+
+
+@functools.lru_cache(maxsize=1)
+def _load_vad() -> silero.VAD:
+    # Thread-based job executors run several jobs in one process; they share a single loaded model.
+    return silero.VAD.load()
+
+
+def _on_metrics_collected(usage_collector: metrics.UsageCollector, ev: MetricsCollectedEvent):
+    metrics.log_metrics(ev.metrics)
+    usage_collector.collect(ev.metrics)
+
 
 def prewarm(proc: JobProcess):
-    proc.userdata["vad"] = silero.VAD.load()
+    proc.userdata["vad"] = _load_vad()
 
 
 async def entrypoint(ctx: JobContext):
+    eager_task_factory = getattr(asyncio, "eager_task_factory", None)
+    if eager_task_factory is not None:  # Python 3.12+
+        # Tasks that finish without suspending (cache hits, resolved futures) skip a trip through the scheduler.
+        asyncio.get_running_loop().set_task_factory(eager_task_factory)
+
     ctx.log_context_fields = {
         "room": ctx.room.name,
     }
@@ -34,18 +85,14 @@ async def entrypoint(ctx: JobContext):
         vad=ctx.proc.userdata["vad"],
         stt=openai.STT(),
         llm=openai.LLM(),
-        tts=openai.TTS(instructions="Use a friendly and professional tone of voice. Be cheerful and encouraging. Sound excited to help the user."),
+        tts=openai.TTS(instructions=_TTS_INSTRUCTIONS),
         preemptive_generation=True,
         resume_false_interruption=True,
         false_interruption_timeout=1.0,
     )
 
     usage_collector = metrics.UsageCollector()
-
-    @session.on("metrics_collected")
-    def _on_metrics_collected(ev: MetricsCollectedEvent):
-        metrics.log_metrics(ev.metrics)
-        usage_collector.collect(ev.metrics)
+    session.on("metrics_collected", functools.partial(_on_metrics_collected, usage_collector))
 
     async def log_usage():
         summary = usage_collector.get_summary()
@@ -72,14 +119,10 @@ async def entrypoint(ctx: JobContext):
     )
 
     if participant_hint:
-        for attr in ("identity", "participant_identity"):
-            if hasattr(room_input_options, attr):
-                setattr(room_input_options, attr, participant_hint)
-                break
-        for attr in ("identity", "participant_identity"):
-            if hasattr(room_output_options, attr):
-                setattr(room_output_options, attr, participant_hint)
-                break
+        if _INPUT_HINT_ATTR:
+            setattr(room_input_options, _INPUT_HINT_ATTR, participant_hint)
+        if _OUTPUT_HINT_ATTR:
+            setattr(room_output_options, _OUTPUT_HINT_ATTR, participant_hint)
 
     try:
         await session.start(
@@ -89,21 +132,22 @@ async def entrypoint(ctx: JobContext):
             room_output_options=room_output_options,
         )
     finally:
-        room_obj = getattr(ctx, "room", None)
+        room = _snapshot(getattr(ctx, "room", None), "sid", "name")
         room_info = {
-            "room_id": getattr(room_obj, "sid", None) or getattr(room_obj, "name", None),
-            "room_sid": getattr(room_obj, "sid", None),
-            "room_name": getattr(room_obj, "name", None),
+            "room_id": room["sid"] or room["name"],
+            "room_sid": room["sid"],
+            "room_name": room["name"],
         }
 
         agent_participant = getattr(session, "agent_participant", None)
         if agent_participant is None:
             agent_participant = getattr(session, "participant", None)
 
+        participant = _snapshot(agent_participant, "sid", "identity")
         participant_info = {
-            "participant_id": getattr(agent_participant, "sid", None) or getattr(agent_participant, "identity", None),
-            "participant_sid": getattr(agent_participant, "sid", None),
-            "participant_identity": getattr(agent_participant, "identity", None),
+            "participant_id": participant["sid"] or participant["identity"],
+            "participant_sid": participant["sid"],
+            "participant_identity": participant["identity"],
         }
 
         supervisor.record_livekit_context(room_info, participant_info)
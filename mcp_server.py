@@ -1,27 +1,33 @@
+import asyncio
 import logging
-from typing import Any, Dict, Optional
+import os
+from typing import Any, Dict, List, Optional, Set
 
 from agents import Agent, Runner, SQLiteSession
-from agents.mcp import MCPServerStdio
+from agents.mcp import MCPServer, MCPServerStdio
 
 logger = logging.getLogger(__name__)
 
 class CodexMCPServer(MCPServerStdio):
     def __init__(self, enable_search: bool = False) -> None:
-        args = ["-y", "codex", "mcp-server"]
-        if enable_search:
-            args = ["-y", "codex", "--search", "mcp-server"]
+        codex_args = ["--search", "mcp-server"] if enable_search else ["mcp-server"]
+        # A pre-installed codex binary skips npx's package resolution on every spawn.
+        codex_bin = os.environ.get("CODEX_MCP_BIN")
+        if codex_bin:
+            command, args = codex_bin, codex_args
+        else:
+            command, args = "npx", ["-y", "codex", *codex_args]
         super().__init__(
             name="Codex MCP Server",
             params={
-                "command": "npx",
+                "command": command,
                 "args": args,
                 },
             client_session_timeout_seconds=360000,
         )
 
 class CodexMCPAgent(Agent):
-    def __init__(self) -> None:
+    def __init__(self, mcp_servers: Optional[List[MCPServer]] = None) -> None:
         super().__init__(
             name="Codex MCP Server Agent",
             instructions=(
@@ -32,7 +38,7 @@ class CodexMCPAgent(Agent):
                 "By default call Codex with \"approval-policy\": \"never\" and \"sandbox\": \"workspace-write\". "
                 "If the voice assistant provides updated session settings, apply those instead."
                 ),
-            mcp_servers=[],
+            mcp_servers=mcp_servers or [],
         )
 
 class CodexCLISession(SQLiteSession):
@@ -44,24 +50,150 @@ class CodexCLISession(SQLiteSession):
         """Update the session identifier while reusing the same underlying storage."""
         self.session_id = session_id
 
+class _MCPServerSlot:
+    """A started MCP server together with the tasks currently using it."""
+    def __init__(self, server: CodexMCPServer, agent: Agent) -> None:
+        self.server = server
+        self.agent = agent
+        self.users = 0
+        self.retired = False
+        self.stop = asyncio.Event()
+        self.owner: Optional[asyncio.Task[None]] = None
+
 class CodexCLIAgent():
     """Codex Agent to send tasks to Codex via MCP server."""
     def __init__(self) -> None:
-        self.server_agent = CodexMCPAgent()
         self.session = CodexCLISession(session_id="codex_agent_session")
         self.settings: Dict[str, Any] = {
             "approval_policy": "never",
             "model": "default",
             "web_search_enabled": False,
         }
+        # One server per web-search flag, so toggling search never closes a server a task is using.
+        self._mcp_slots: Dict[bool, _MCPServerSlot] = {}
+        # Every server whose owner task is still running, including retired ones still in use.
+        self._live_mcp_slots: Set[_MCPServerSlot] = set()
+        self._mcp_lock = asyncio.Lock()
+        self._prewarm_task: Optional[asyncio.Task[None]] = None
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            pass  # constructed outside the event loop; the server starts with the first task
+        else:
+            self._prewarm_task = asyncio.create_task(self._prewarm())
+
+    async def _prewarm(self) -> None:
+        """Start the MCP server in the background so the first task does not pay the npx cold start."""
+        try:
+            slot = await self._acquire_mcp_server()
+        except Exception as error:
+            # send_task will try again when the first task arrives.
+            logger.warning("Failed to prewarm the Codex MCP server: %s", error)
+        else:
+            self._release_mcp_server(slot)
     
     async def send_task(self, task_prompt: str) -> Any:
         """Sends the task prompt to Codex via MCP server and returns the result."""
+        slot = await self._acquire_mcp_server()
+        try:
+            return await Runner.run(slot.agent, task_prompt, session=self.session)
+        except Exception:
+            # Other tasks may share this server; only recycle it once its connection is gone.
+            if not await self._mcp_server_alive(slot):
+                self._retire_mcp_server(slot)
+            raise
+        finally:
+            self._release_mcp_server(slot)
+
+    async def _acquire_mcp_server(self) -> _MCPServerSlot:
+        """Return the server for the current web-search setting, starting it if needed, and count this user."""
         enable_search = bool(self.settings.get("web_search_enabled", False))
-        async with CodexMCPServer(enable_search=enable_search) as mcp_server:
-            self.server_agent.mcp_servers = [mcp_server]
-            result = await Runner.run(self.server_agent, task_prompt, session=self.session)
-            return result
+        async with self._mcp_lock:
+            other = self._mcp_slots.get(not enable_search)
+            if other is not None:
+                # Web search was toggled; the other server closes once its running tasks finish.
+                self._retire_mcp_server(other)
+            slot = self._mcp_slots.get(enable_search)
+            if slot is None:
+                slot = await self._start_mcp_server(enable_search)
+                self._mcp_slots[enable_search] = slot
+            slot.users += 1
+            return slot
+
+    async def _start_mcp_server(self, enable_search: bool) -> _MCPServerSlot:
+        mcp_server = CodexMCPServer(enable_search=enable_search)
+        slot = _MCPServerSlot(mcp_server, CodexMCPAgent(mcp_servers=[mcp_server]))
+        ready: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        slot.owner = asyncio.create_task(self._run_mcp_server(slot, ready))
+        self._live_mcp_slots.add(slot)
+        try:
+            # Shielded so a cancelled caller (e.g. the prewarm during aclose) does not cancel the start.
+            await asyncio.shield(ready)
+        except BaseException:
+            slot.stop.set()
+            raise
+        return slot
+
+    async def _run_mcp_server(self, slot: _MCPServerSlot, ready: "asyncio.Future[None]") -> None:
+        """Own the server from connect to cleanup; the MCP stdio client must enter and exit in one task."""
+        try:
+            try:
+                await slot.server.connect()
+            except Exception as error:
+                if not ready.done():
+                    ready.set_exception(error)
+                return
+            if not ready.done():
+                ready.set_result(None)
+            await slot.stop.wait()
+        finally:
+            if not ready.done():
+                ready.cancel()
+            self._live_mcp_slots.discard(slot)
+            await slot.server.cleanup()
+
+    def _release_mcp_server(self, slot: _MCPServerSlot) -> None:
+        slot.users -= 1
+        if slot.retired and slot.users == 0:
+            slot.stop.set()
+
+    def _retire_mcp_server(self, slot: _MCPServerSlot) -> None:
+        """Stop handing out the server; it is cleaned up when its last user releases it."""
+        slot.retired = True
+        for enable_search, current in list(self._mcp_slots.items()):
+            if current is slot:
+                del self._mcp_slots[enable_search]
+        if slot.users == 0:
+            slot.stop.set()
+
+    async def _mcp_server_alive(self, slot: _MCPServerSlot) -> bool:
+        """Return whether the server still answers, telling a failed call apart from a dead process."""
+        if slot.owner is None or slot.owner.done() or slot.server.session is None:
+            return False
+        try:
+            await asyncio.wait_for(slot.server.list_tools(), timeout=10)
+        except Exception:
+            return False
+        return True
+
+    async def aclose(self) -> None:
+        """Stop the MCP server processes, if any are running."""
+        prewarm_task, self._prewarm_task = self._prewarm_task, None
+        if prewarm_task is not None:
+            # A prewarm still connecting must not attach a server after shutdown.
+            prewarm_task.cancel()
+            await asyncio.wait([prewarm_task])
+        async with self._mcp_lock:
+            self._mcp_slots = {}
+            slots = list(self._live_mcp_slots)
+        owners = []
+        for slot in slots:
+            slot.retired = True
+            slot.stop.set()
+            if slot.owner is not None:
+                owners.append(slot.owner)
+        if owners:
+            await asyncio.wait(owners)
 
     def update_settings(
         self,
@@ -87,5 +219,5 @@ class CodexCLIAgent():
                 self.session = CodexCLISession(session_id=new_session_id)
             return True
         except Exception as error:
-            logger.exception(f"Failed to rename Codex session to {new_session_id}: {error}")
+            logger.exception("Failed to rename Codex session to %s: %s", new_session_id, error)
             return False
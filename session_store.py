@@ -1,11 +1,42 @@
 import copy
+import itertools
 import json
 import os
+import queue
 import sqlite3
+import time
 from contextlib import contextmanager
 from dataclasses import dataclass
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is an optional speed-up
+    orjson = None
+
+
+def _dumps(payload: Any) -> str:
+    """Serialize ``payload`` to JSON text, using orjson when it is installed."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(payload, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+        except TypeError:
+            # Values orjson rejects (e.g. integers beyond 64 bits) still round-trip through json.
+            pass
+    return json.dumps(payload)
+
+
+def _loads(payload: str) -> Any:
+    """Parse JSON text, using orjson when it is installed."""
+    if orjson is not None:
+        try:
+            return orjson.loads(payload)
+        except orjson.JSONDecodeError:
+            # Rows written by json.dumps may contain NaN/Infinity, which orjson refuses.
+            pass
+    return json.loads(payload)
 
 
 def _now_iso() -> str:
@@ -13,6 +44,11 @@ def _now_iso() -> str:
     return datetime.utcnow().replace(microsecond=0).isoformat() + "Z"
 
 
+# Stamped on metadata once its default sections are filled in; stored payloads carrying the
+# current value skip the check on load. Bump it when a new default section is added.
+_METADATA_SCHEMA_VERSION = 1
+
+
 def _default_metrics() -> Dict[str, Any]:
     """Return default metrics structure for a session."""
     return {
@@ -52,15 +88,23 @@ def _default_settings() -> Dict[str, Any]:
 def _default_metadata() -> Dict[str, Any]:
     """Return an empty metadata payload for a session."""
     return {
+        "schema_version": _METADATA_SCHEMA_VERSION,
         "tasks": [],
         "metrics": _default_metrics(),
         "settings": _default_settings(),
     }
 
 
+def _dump_metadata(metadata: Dict[str, Any]) -> str:
+    """Serialize session metadata for the sessions table; tasks live in session_tasks."""
+    return _dumps({key: value for key, value in metadata.items() if key != "tasks"})
+
+
 def _ensure_metadata_defaults(metadata: Dict[str, Any]) -> Dict[str, Any]:
     """Ensure metadata payload contains default sections."""
     metadata.setdefault("tasks", [])
+    if metadata.get("schema_version") == _METADATA_SCHEMA_VERSION:
+        return metadata
 
     metrics = metadata.get("metrics")
     if not isinstance(metrics, dict):
@@ -90,6 +134,7 @@ def _ensure_metadata_defaults(metadata: Dict[str, Any]) -> Dict[str, Any]:
         for key, value in default_settings.items():
             settings.setdefault(key, value)
 
+    metadata["schema_version"] = _METADATA_SCHEMA_VERSION
     return metadata
 
 
@@ -100,30 +145,78 @@ class SessionRecord:
     created_at: str
     updated_at: str
     metadata: Dict[str, Any]
+    task_count: int = 0
+
+
+# Writes a session's metadata, creating the row if needed; branch_name and created_at are only used on insert.
+_UPSERT_SESSION_METADATA = """
+    INSERT INTO sessions (session_id, branch_name, metadata, created_at, updated_at)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(session_id) DO UPDATE SET metadata = excluded.metadata, updated_at = excluded.updated_at
+"""
 
 
 class SessionStore:
     """Persistent store tracking Codex sessions and their metadata."""
 
+    RECORD_CACHE_TTL = 2.0
+
     def __init__(self, db_path: Optional[str] = None) -> None:
         base_dir = os.path.dirname(os.path.abspath(__file__))
         self.db_path = db_path or os.path.join(base_dir, "codex_sessions.sqlite3")
         self.tasks_dir = os.path.join(base_dir, "tasks")
         os.makedirs(self.tasks_dir, exist_ok=True)
+        self._metrics_versions: Dict[str, int] = {}
+        self._version_counter = itertools.count(1)
+        self._record_cache: Dict[str, Tuple[float, SessionRecord]] = {}
+        self._record_cache_epoch = 0
+        self._idle_connections: "queue.SimpleQueue[sqlite3.Connection]" = queue.SimpleQueue()
         self._ensure_schema()
 
     @contextmanager
-    def _connect(self):
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
+    def _connect(self, immediate: bool = False):
+        """Borrow a pooled connection that commits on success and rolls back on error.
+
+        ``immediate`` takes the write lock up front, so read-modify-write callers cannot
+        interleave with another writer between their SELECT and their write.
+        """
+        try:
+            conn = self._idle_connections.get_nowait()
+        except queue.Empty:
+            conn = self._open_connection()
         try:
+            if immediate:
+                conn.execute("BEGIN IMMEDIATE")
             yield conn
             conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
         finally:
-            conn.close()
+            self._idle_connections.put(conn)
+
+    def _open_connection(self) -> sqlite3.Connection:
+        # Pooled connections move between the event loop and worker threads, one user at a time.
+        # timeout doubles as the busy timeout while another connection holds the write lock.
+        conn = sqlite3.connect(self.db_path, timeout=5.0, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        # Per-connection setting: with WAL, NORMAL only syncs at checkpoints instead of on every commit.
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def close(self) -> None:
+        """Close every idle pooled connection."""
+        while True:
+            try:
+                self._idle_connections.get_nowait().close()
+            except queue.Empty:
+                return
 
     def _ensure_schema(self) -> None:
         with self._connect() as conn:
+            if self.db_path != ":memory:":
+                # WAL is persisted in the database file, so this only has an effect the first time.
+                conn.execute("PRAGMA journal_mode=WAL")
             conn.execute(
                 """
                 CREATE TABLE IF NOT EXISTS sessions (
@@ -144,61 +237,163 @@ class SessionStore:
                 )
                 """
             )
-
-    def ensure_session(self, session_id: str, branch_name: Optional[str]) -> SessionRecord:
-        """Create the session record if it does not already exist."""
-        now = _now_iso()
-        with self._connect() as conn:
-            existing = conn.execute(
-                "SELECT session_id, branch_name, metadata, created_at, updated_at FROM sessions WHERE session_id = ?",
-                (session_id,),
-            ).fetchone()
-            if existing:
-                stored_metadata = json.loads(existing["metadata"])
-                metadata = _ensure_metadata_defaults(stored_metadata)
-                branch_to_store = branch_name or existing["branch_name"]
-                created_at = existing["created_at"]
-                self._ensure_archive_file(
-                    metadata,
-                    session_id=session_id,
-                    branch_name=branch_to_store,
-                    created_at=created_at,
-                    updated_at=now,
-                )
-                conn.execute(
-                    "UPDATE sessions SET branch_name = ?, metadata = ?, updated_at = ? WHERE session_id = ?",
-                    (branch_to_store, json.dumps(metadata), now, session_id),
-                )
-                return SessionRecord(
-                    session_id=session_id,
-                    branch_name=branch_to_store,
-                    created_at=created_at,
-                    updated_at=now,
-                    metadata=metadata,
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS session_tasks (
+                    session_id TEXT NOT NULL,
+                    seq INTEGER NOT NULL,
+                    entry TEXT NOT NULL,
+                    PRIMARY KEY (session_id, seq)
                 )
-
-            metadata = _default_metadata()
-            self._ensure_archive_file(
-                metadata,
-                session_id=session_id,
-                branch_name=branch_name,
-                created_at=now,
-                updated_at=now,
+                """
             )
+            if conn.execute("PRAGMA user_version").fetchone()[0] < 1:
+                self._move_tasks_out_of_metadata(conn)
+                conn.execute("PRAGMA user_version = 1")
+
+    def _move_tasks_out_of_metadata(self, conn: sqlite3.Connection) -> None:
+        """One-time migration of task histories stored inside the metadata JSON into session_tasks."""
+        for row in conn.execute("SELECT session_id, metadata FROM sessions").fetchall():
+            metadata = _loads(row["metadata"])
+            tasks = metadata.pop("tasks", None)
+            if isinstance(tasks, list):
+                conn.executemany(
+                    "INSERT OR IGNORE INTO session_tasks (session_id, seq, entry) VALUES (?, ?, ?)",
+                    ((row["session_id"], seq, _dumps(task)) for seq, task in enumerate(tasks, start=1)),
+                )
             conn.execute(
-                """
-                INSERT INTO sessions (session_id, branch_name, metadata, created_at, updated_at)
-                VALUES (?, ?, ?, ?, ?)
-                """,
-                (session_id, branch_name, json.dumps(metadata), now, now),
+                "UPDATE sessions SET metadata = ? WHERE session_id = ?",
+                (_dumps(metadata), row["session_id"]),
             )
-            return SessionRecord(
-                session_id=session_id,
-                branch_name=branch_name,
-                created_at=now,
-                updated_at=now,
-                metadata=metadata,
+
+    @staticmethod
+    def _task_texts(conn: sqlite3.Connection, session_id: str) -> List[str]:
+        return [
+            text
+            for (text,) in conn.execute(
+                "SELECT entry FROM session_tasks WHERE session_id = ? ORDER BY seq",
+                (session_id,),
             )
+        ]
+
+    def _load_tasks(self, conn: sqlite3.Connection, session_id: str) -> List[Dict[str, Any]]:
+        return [_loads(text) for text in self._task_texts(conn, session_id)]
+
+    @staticmethod
+    def _insert_task(conn: sqlite3.Connection, session_id: str, entry: Dict[str, Any]) -> str:
+        """Store a task entry and return its serialized text."""
+        entry_text = _dumps(entry)
+        conn.execute(
+            """
+            INSERT INTO session_tasks (session_id, seq, entry)
+            VALUES (?, COALESCE((SELECT MAX(seq) FROM session_tasks WHERE session_id = ?), 0) + 1, ?)
+            """,
+            (session_id, session_id, entry_text),
+        )
+        return entry_text
+
+    def ensure_session(self, session_id: str, branch_name: Optional[str]) -> SessionRecord:
+        """Create the session record if it does not already exist."""
+        now = _now_iso()
+        try:
+            with self._connect(immediate=True) as conn:
+                existing = conn.execute(
+                    "SELECT session_id, branch_name, metadata, created_at, updated_at FROM sessions WHERE session_id = ?",
+                    (session_id,),
+                ).fetchone()
+                if existing:
+                    stored_metadata = _loads(existing["metadata"])
+                    metadata = _ensure_metadata_defaults(stored_metadata)
+                    branch_to_store = branch_name or existing["branch_name"]
+                    created_at = existing["created_at"]
+                    self._ensure_archive_file(
+                        conn,
+                        metadata,
+                        session_id=session_id,
+                        branch_name=branch_to_store,
+                        created_at=created_at,
+                    )
+                    conn.execute(
+                        "UPDATE sessions SET branch_name = ?, metadata = ?, updated_at = ? WHERE session_id = ?",
+                        (branch_to_store, _dump_metadata(metadata), now, session_id),
+                    )
+                    metadata["tasks"] = self._load_tasks(conn, session_id)
+                    return SessionRecord(
+                        session_id=session_id,
+                        branch_name=branch_to_store,
+                        created_at=created_at,
+                        updated_at=now,
+                        metadata=metadata,
+                        task_count=len(metadata["tasks"]),
+                    )
+
+                return self._insert_session(conn, session_id, branch_name, now)
+        finally:
+            self._bump_metrics_version(session_id)
+
+    def atomic_new_session(
+        self,
+        old_session_id: Optional[str],
+        old_branch_name: Optional[str],
+        new_session_id: Optional[str],
+        new_branch_name: Optional[str],
+    ) -> Tuple[bool, Optional[SessionRecord]]:
+        """Persist the session being left and register the new one in a single transaction.
+
+        Returns ``(already_existed, record)``; the record is None when the new id was already
+        stored (or when no new id was given) and nothing was created for it.
+        """
+        now = _now_iso()
+        try:
+            with self._connect(immediate=True) as conn:
+                if old_session_id:
+                    touched = conn.execute(
+                        "UPDATE sessions SET branch_name = COALESCE(?, branch_name), updated_at = ? WHERE session_id = ?",
+                        (old_branch_name or None, now, old_session_id),
+                    )
+                    if touched.rowcount == 0:
+                        self._insert_session(conn, old_session_id, old_branch_name, now)
+                if not new_session_id:
+                    return False, None
+                existing = conn.execute(
+                    "SELECT 1 FROM sessions WHERE session_id = ?",
+                    (new_session_id,),
+                ).fetchone()
+                if existing:
+                    return True, None
+                return False, self._insert_session(conn, new_session_id, new_branch_name, now)
+        finally:
+            self._bump_metrics_version(*(sid for sid in (old_session_id, new_session_id) if sid))
+
+    def _insert_session(
+        self,
+        conn: sqlite3.Connection,
+        session_id: str,
+        branch_name: Optional[str],
+        now: str,
+    ) -> SessionRecord:
+        metadata = _default_metadata()
+        self._ensure_archive_file(
+            conn,
+            metadata,
+            session_id=session_id,
+            branch_name=branch_name,
+            created_at=now,
+        )
+        conn.execute(
+            """
+            INSERT INTO sessions (session_id, branch_name, metadata, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+            (session_id, branch_name, _dump_metadata(metadata), now, now),
+        )
+        return SessionRecord(
+            session_id=session_id,
+            branch_name=branch_name,
+            created_at=now,
+            updated_at=now,
+            metadata=metadata,
+        )
 
     def session_exists(self, session_id: str) -> bool:
         with self._connect() as conn:
@@ -208,23 +403,67 @@ class SessionStore:
             ).fetchone()
             return row is not None
 
+    def list_session_ids(self) -> List[str]:
+        """Return every stored session id without loading session metadata."""
+        return list(self.iter_session_ids())
+
+    def iter_session_ids(self) -> Iterator[str]:
+        """Yield stored session ids straight from the cursor."""
+        with self._connect() as conn:
+            for (session_id,) in conn.execute("SELECT session_id FROM sessions"):
+                yield session_id
+
     def list_sessions(self) -> List[SessionRecord]:
+        """Return every session record, most recently used first, with its task history loaded."""
+        return list(self.iter_sessions(with_tasks=True))
+
+    def iter_sessions(self, limit: Optional[int] = None, *, with_tasks: bool = False) -> Iterator[SessionRecord]:
+        """Yield session records, most recently used first, parsing each row only when it is reached.
+
+        Unless ``with_tasks`` is set, task entries are not loaded and the metadata has no
+        ``tasks`` key; ``task_count`` carries the number of stored tasks either way.
+        """
+        query = (
+            "SELECT session_id, branch_name, metadata, created_at, updated_at, "
+            "(SELECT COUNT(*) FROM session_tasks WHERE session_tasks.session_id = sessions.session_id) AS task_count "
+            "FROM sessions ORDER BY updated_at DESC"
+        )
+        params: Tuple[Any, ...] = ()
+        if limit is not None:
+            query += " LIMIT ?"
+            params = (max(limit, 0),)
         with self._connect() as conn:
-            rows = conn.execute(
-                "SELECT session_id, branch_name, metadata, created_at, updated_at FROM sessions ORDER BY updated_at DESC"
-            ).fetchall()
-            return [
-                SessionRecord(
+            for row in conn.execute(query, params):
+                metadata = _ensure_metadata_defaults(_loads(row["metadata"]))
+                if with_tasks:
+                    metadata["tasks"] = self._load_tasks(conn, row["session_id"])
+                else:
+                    del metadata["tasks"]
+                yield SessionRecord(
                     session_id=row["session_id"],
                     branch_name=row["branch_name"],
                     created_at=row["created_at"],
                     updated_at=row["updated_at"],
-                    metadata=_ensure_metadata_defaults(json.loads(row["metadata"])),
+                    metadata=metadata,
+                    task_count=row["task_count"],
                 )
-                for row in rows
-            ]
 
     def get_session(self, session_id: str) -> Optional[SessionRecord]:
+        """Return the stored session, reusing a recent read for up to ``RECORD_CACHE_TTL`` seconds.
+
+        Cached records are shared between callers and must be treated as read-only.
+        """
+        cached = self._record_cache.get(session_id)
+        if cached is not None and time.monotonic() - cached[0] < self.RECORD_CACHE_TTL:
+            return cached[1]
+        epoch = self._record_cache_epoch
+        record = self._read_session(session_id)
+        # A write that landed while this read was in flight must not be shadowed by it.
+        if record is not None and epoch == self._record_cache_epoch:
+            self._record_cache[session_id] = (time.monotonic(), record)
+        return record
+
+    def _read_session(self, session_id: str) -> Optional[SessionRecord]:
         with self._connect() as conn:
             row = conn.execute(
                 "SELECT session_id, branch_name, metadata, created_at, updated_at FROM sessions WHERE session_id = ?",
@@ -232,14 +471,30 @@ class SessionStore:
             ).fetchone()
             if not row:
                 return None
-            metadata = _ensure_metadata_defaults(json.loads(row["metadata"]))
+            metadata = _ensure_metadata_defaults(_loads(row["metadata"]))
+            metadata["tasks"] = self._load_tasks(conn, session_id)
             return SessionRecord(
                 session_id=row["session_id"],
                 branch_name=row["branch_name"],
                 created_at=row["created_at"],
                 updated_at=row["updated_at"],
                 metadata=metadata,
+                task_count=len(metadata["tasks"]),
+            )
+
+    def touch(self, session_id: str, branch_name: Optional[str] = None) -> bool:
+        """Mark an existing session as used now without rewriting its metadata.
+
+        The branch is only replaced when one is given. Returns False if the session does not exist.
+        """
+        now = _now_iso()
+        with self._connect() as conn:
+            updated = conn.execute(
+                "UPDATE sessions SET branch_name = COALESCE(?, branch_name), updated_at = ? WHERE session_id = ?",
+                (branch_name or None, now, session_id),
             )
+        self._forget_sessions(session_id)
+        return updated.rowcount > 0
 
     def update_branch(self, session_id: str, branch_name: str) -> None:
         now = _now_iso()
@@ -248,6 +503,7 @@ class SessionStore:
                 "UPDATE sessions SET branch_name = ?, updated_at = ? WHERE session_id = ?",
                 (branch_name, now, session_id),
             )
+        self._forget_sessions(session_id)
 
     def append_task(self, session_id: str, prompt: str, result: Optional[str]) -> None:
         self.append_entry(session_id, prompt=prompt, result=result, entry_type="task")
@@ -263,7 +519,7 @@ class SessionStore:
     ) -> None:
         """Generalized append with custom entry type."""
         now = _now_iso()
-        with self._connect() as conn:
+        with self._connect(immediate=True) as conn:
             row = conn.execute(
                 "SELECT branch_name, metadata, created_at FROM sessions WHERE session_id = ?",
                 (session_id,),
@@ -273,7 +529,7 @@ class SessionStore:
                 created_at = now
                 branch_name = None
             else:
-                metadata = _ensure_metadata_defaults(json.loads(row["metadata"]))
+                metadata = _ensure_metadata_defaults(_loads(row["metadata"]))
                 created_at = row["created_at"]
                 branch_name = row["branch_name"]
 
@@ -286,29 +542,22 @@ class SessionStore:
             if extra:
                 entry["extra"] = extra
 
-            metadata["tasks"].append(entry)
-
-            self._ensure_archive_file(
+            archive_path = self._ensure_archive_file(
+                conn,
                 metadata,
                 session_id=session_id,
                 branch_name=branch_name,
                 created_at=created_at,
-                updated_at=now,
             )
+            self._append_archive_line(archive_path, self._insert_task(conn, session_id, entry))
 
-            conn.execute(
-                "INSERT OR IGNORE INTO sessions (session_id, branch_name, metadata, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
-                (session_id, branch_name, json.dumps(metadata), created_at, now),
-            )
-            conn.execute(
-                "UPDATE sessions SET metadata = ?, updated_at = ? WHERE session_id = ?",
-                (json.dumps(metadata), now, session_id),
-            )
+            conn.execute(_UPSERT_SESSION_METADATA, (session_id, branch_name, _dump_metadata(metadata), created_at, now))
+        self._forget_sessions(session_id)
 
     def update_metrics(self, session_id: str, metrics_update: Dict[str, Any]) -> None:
         """Merge metrics payload into stored metadata."""
         now = _now_iso()
-        with self._connect() as conn:
+        with self._connect(immediate=True) as conn:
             row = conn.execute(
                 "SELECT branch_name, metadata, created_at FROM sessions WHERE session_id = ?",
                 (session_id,),
@@ -318,28 +567,22 @@ class SessionStore:
                 created_at = now
                 branch_name = None
             else:
-                metadata = _ensure_metadata_defaults(json.loads(row["metadata"]))
+                metadata = _ensure_metadata_defaults(_loads(row["metadata"]))
                 created_at = row["created_at"]
                 branch_name = row["branch_name"]
 
             stored_metrics: Dict[str, Any] = metadata.setdefault("metrics", _default_metrics())
             _deep_update(stored_metrics, metrics_update)
 
-            conn.execute(
-                "INSERT OR IGNORE INTO sessions (session_id, branch_name, metadata, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
-                (session_id, branch_name, json.dumps(metadata), created_at, now),
-            )
-            conn.execute(
-                "UPDATE sessions SET metadata = ?, updated_at = ? WHERE session_id = ?",
-                (json.dumps(metadata), now, session_id),
-            )
+            conn.execute(_UPSERT_SESSION_METADATA, (session_id, branch_name, _dump_metadata(metadata), created_at, now))
+        self._bump_metrics_version(session_id)
 
     def record_usage_warning(self, session_id: str, window: str, threshold: int) -> None:
         """Persist a usage warning level that has been communicated to the user."""
         if window not in {"five_hour", "weekly"}:
             return
         now = _now_iso()
-        with self._connect() as conn:
+        with self._connect(immediate=True) as conn:
             row = conn.execute(
                 "SELECT branch_name, metadata, created_at FROM sessions WHERE session_id = ?",
                 (session_id,),
@@ -349,7 +592,7 @@ class SessionStore:
                 created_at = now
                 branch_name = None
             else:
-                metadata = _ensure_metadata_defaults(json.loads(row["metadata"]))
+                metadata = _ensure_metadata_defaults(_loads(row["metadata"]))
                 created_at = row["created_at"]
                 branch_name = row["branch_name"]
 
@@ -361,14 +604,97 @@ class SessionStore:
                 levels.append(threshold)
                 levels.sort()
 
-            conn.execute(
-                "INSERT OR IGNORE INTO sessions (session_id, branch_name, metadata, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
-                (session_id, branch_name, json.dumps(metadata), created_at, now),
-            )
-            conn.execute(
-                "UPDATE sessions SET metadata = ?, updated_at = ? WHERE session_id = ?",
-                (json.dumps(metadata), now, session_id),
+            conn.execute(_UPSERT_SESSION_METADATA, (session_id, branch_name, _dump_metadata(metadata), created_at, now))
+        self._bump_metrics_version(session_id)
+
+    def apply_turn(
+        self,
+        session_id: str,
+        *,
+        prompt: str,
+        result: Optional[str],
+        entry_type: str = "task",
+        extra: Optional[Dict[str, Any]] = None,
+        metrics_update: Optional[Dict[str, Any]] = None,
+        usage_warnings: Optional[List[Tuple[str, int]]] = None,
+        settings_update: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """Persist a Codex turn's metrics, settings, activity entry, and usage warnings in one write.
+
+        Returns the session's metrics as stored after the write.
+        """
+        now = _now_iso()
+        with self._connect(immediate=True) as conn:
+            row = conn.execute(
+                "SELECT branch_name, metadata, created_at FROM sessions WHERE session_id = ?",
+                (session_id,),
+            ).fetchone()
+            if not row:
+                metadata = _default_metadata()
+                created_at = now
+                branch_name = None
+            else:
+                metadata = _ensure_metadata_defaults(_loads(row["metadata"]))
+                created_at = row["created_at"]
+                branch_name = row["branch_name"]
+
+            metrics: Dict[str, Any] = metadata.setdefault("metrics", _default_metrics())
+            if metrics_update:
+                _deep_update(metrics, metrics_update)
+
+            if usage_warnings:
+                token_usage = metrics.setdefault("token_usage", _default_metrics()["token_usage"])
+                warnings = token_usage.setdefault("warnings", {"five_hour": [], "weekly": []})
+                for window, threshold in usage_warnings:
+                    if window not in {"five_hour", "weekly"}:
+                        continue
+                    levels: List[int] = warnings.setdefault(window, [])
+                    if threshold not in levels:
+                        levels.append(threshold)
+                        levels.sort()
+
+            if settings_update:
+                metadata.setdefault("settings", _default_settings()).update(settings_update)
+
+            entry: Dict[str, Any] = {
+                "prompt": prompt,
+                "result": result,
+                "timestamp": now,
+                "type": entry_type,
+            }
+            if extra:
+                entry["extra"] = extra
+            archive_path = self._ensure_archive_file(
+                conn,
+                metadata,
+                session_id=session_id,
+                branch_name=branch_name,
+                created_at=created_at,
             )
+            self._append_archive_line(archive_path, self._insert_task(conn, session_id, entry))
+
+            conn.execute(_UPSERT_SESSION_METADATA, (session_id, branch_name, _dump_metadata(metadata), created_at, now))
+        if metrics_update or usage_warnings:
+            self._bump_metrics_version(session_id)
+        else:
+            self._forget_sessions(session_id)
+        return metrics
+
+    def metrics_version(self, session_id: str) -> int:
+        """Return a counter that changes whenever this store rewrites the session's metrics."""
+        return self._metrics_versions.get(session_id, 0)
+
+    def _bump_metrics_version(self, *session_ids: str) -> None:
+        version = next(self._version_counter)
+        for session_id in session_ids:
+            self._metrics_versions[session_id] = version
+        self._forget_sessions(*session_ids)
+
+    def _forget_sessions(self, *session_ids: str) -> None:
+        """Drop cached reads of sessions that were just written."""
+        self._record_cache_epoch += 1
+        for session_id in session_ids:
+            self._record_cache.pop(session_id, None)
 
     def get_metrics(self, session_id: str) -> Optional[Dict[str, Any]]:
         record = self.get_session(session_id)
@@ -378,7 +704,7 @@ class SessionStore:
 
     def update_settings(self, session_id: str, settings_update: Dict[str, Any]) -> None:
         now = _now_iso()
-        with self._connect() as conn:
+        with self._connect(immediate=True) as conn:
             row = conn.execute(
                 "SELECT branch_name, metadata, created_at FROM sessions WHERE session_id = ?",
                 (session_id,),
@@ -388,21 +714,15 @@ class SessionStore:
                 created_at = now
                 branch_name = None
             else:
-                metadata = _ensure_metadata_defaults(json.loads(row["metadata"]))
+                metadata = _ensure_metadata_defaults(_loads(row["metadata"]))
                 created_at = row["created_at"]
                 branch_name = row["branch_name"]
 
             settings = metadata.setdefault("settings", _default_settings())
             settings.update(settings_update)
 
-            conn.execute(
-                "INSERT OR IGNORE INTO sessions (session_id, branch_name, metadata, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
-                (session_id, branch_name, json.dumps(metadata), created_at, now),
-            )
-            conn.execute(
-                "UPDATE sessions SET metadata = ?, updated_at = ? WHERE session_id = ?",
-                (json.dumps(metadata), now, session_id),
-            )
+            conn.execute(_UPSERT_SESSION_METADATA, (session_id, branch_name, _dump_metadata(metadata), created_at, now))
+        self._forget_sessions(session_id)
 
     def get_settings(self, session_id: str) -> Optional[Dict[str, Any]]:
         record = self.get_session(session_id)
@@ -418,7 +738,7 @@ class SessionStore:
         if old_session_id == new_session_id:
             return True
         now = _now_iso()
-        with self._connect() as conn:
+        with self._connect(immediate=True) as conn:
             existing = conn.execute(
                 "SELECT 1 FROM sessions WHERE session_id = ?",
                 (new_session_id,),
@@ -429,54 +749,67 @@ class SessionStore:
                 "UPDATE sessions SET session_id = ?, updated_at = ? WHERE session_id = ?",
                 (new_session_id, now, old_session_id),
             )
-            return updated.rowcount > 0
+            conn.execute(
+                "UPDATE session_tasks SET session_id = ? WHERE session_id = ?",
+                (new_session_id, old_session_id),
+            )
+            row = conn.execute(
+                "SELECT branch_name, metadata, created_at FROM sessions WHERE session_id = ?",
+                (new_session_id,),
+            ).fetchone()
+            archive_filename = _loads(row["metadata"]).get("task_archive_file") if row else None
+            if archive_filename and archive_filename.endswith(".jsonl"):
+                # The header line names the session, so a rename is the one time the archive is rewritten.
+                self._write_archive_file(
+                    os.path.join(self.tasks_dir, archive_filename),
+                    session_id=new_session_id,
+                    branch_name=row["branch_name"],
+                    created_at=row["created_at"],
+                    task_texts=self._task_texts(conn, new_session_id),
+                )
+        self._bump_metrics_version(old_session_id, new_session_id)
+        return updated.rowcount > 0
 
     def _ensure_archive_file(
         self,
+        conn: sqlite3.Connection,
         metadata: Dict[str, Any],
         *,
         session_id: str,
         branch_name: Optional[str],
         created_at: str,
-        updated_at: str,
-    ) -> None:
-        """Ensure a per-session archive file exists and mirrors stored tasks."""
-        archive_filename = metadata.get("task_archive_file")
-        archive_path = None
-        if archive_filename:
-            archive_path = os.path.join(self.tasks_dir, archive_filename)
-            if not os.path.exists(archive_path):
-                archive_filename = None
+    ) -> str:
+        """Return the path of the session's JSON-lines archive, creating it if it is missing.
 
-        if not archive_filename:
-            archive_filename = self._generate_archive_filename()
-            metadata["task_archive_file"] = archive_filename
-            archive_path = os.path.join(self.tasks_dir, archive_filename)
-        else:
+        A new archive (including one replacing a pre-JSON-lines ``.json`` archive) is backfilled
+        with the stored tasks once; after that entries are only appended.
+        """
+        archive_filename = metadata.get("task_archive_file")
+        if archive_filename and archive_filename.endswith(".jsonl"):
             archive_path = os.path.join(self.tasks_dir, archive_filename)
+            if os.path.exists(archive_path):
+                return archive_path
 
-        tasks = metadata.get("tasks")
-        if not isinstance(tasks, list):
-            tasks = []
-            metadata["tasks"] = tasks
-
+        archive_filename = self._generate_archive_filename()
+        metadata["task_archive_file"] = archive_filename
+        archive_path = os.path.join(self.tasks_dir, archive_filename)
         self._write_archive_file(
             archive_path,
             session_id=session_id,
             branch_name=branch_name,
             created_at=created_at,
-            updated_at=updated_at,
-            tasks=tasks,
+            task_texts=self._task_texts(conn, session_id),
         )
+        return archive_path
 
     def _generate_archive_filename(self) -> str:
         """Build a unique, timestamped archive filename."""
         timestamp = datetime.utcnow().strftime("%Y%m%d-%H%M%S")
-        base_name = f"session-{timestamp}.json"
+        base_name = f"session-{timestamp}.jsonl"
         candidate = base_name
         suffix = 1
         while os.path.exists(os.path.join(self.tasks_dir, candidate)):
-            candidate = f"session-{timestamp}-{suffix}.json"
+            candidate = f"session-{timestamp}-{suffix}.jsonl"
             suffix += 1
         return candidate
 
@@ -487,19 +820,18 @@ class SessionStore:
         session_id: str,
         branch_name: Optional[str],
         created_at: str,
-        updated_at: str,
-        tasks: List[Dict[str, Any]],
+        task_texts: List[str],
     ) -> None:
-        payload = {
-            "session_id": session_id,
-            "branch_name": branch_name,
-            "created_at": created_at,
-            "updated_at": updated_at,
-            "tasks": tasks,
-        }
+        """Write a whole archive: a session header line followed by one stored task entry per line."""
+        header = _dumps({"session_id": session_id, "branch_name": branch_name, "created_at": created_at})
         os.makedirs(self.tasks_dir, exist_ok=True)
         with open(archive_path, "w", encoding="utf-8") as stream:
-            json.dump(payload, stream, indent=2)
+            stream.writelines(f"{line}\n" for line in (header, *task_texts))
+
+    @staticmethod
+    def _append_archive_line(archive_path: str, entry_text: str) -> None:
+        with open(archive_path, "a", encoding="utf-8") as stream:
+            stream.write(f"{entry_text}\n")
 
     def get_livekit_state(self) -> Dict[str, Any]:
         with self._connect() as conn:
@@ -510,7 +842,7 @@ class SessionStore:
             if not row:
                 return {}
             try:
-                state = json.loads(row["value"])
+                state = _loads(row["value"])
                 if isinstance(state, dict):
                     return state
             except json.JSONDecodeError:
@@ -519,7 +851,7 @@ class SessionStore:
 
     def set_livekit_state(self, state: Dict[str, Any]) -> None:
         now = _now_iso()
-        payload = json.dumps(state)
+        payload = _dumps(state)
         with self._connect() as conn:
             conn.execute(
                 """
@@ -1,6 +1,5 @@
-import asyncio
 import logging
-from typing import Any, Dict, Optional, TypedDict
+from typing import Any, Dict, NamedTuple, Optional, TypedDict
 
 from livekit.agents import RunContext, function_tool
 
@@ -16,6 +15,13 @@ class CodexTaskResult(TypedDict, total=False):
     error: str
 
 
+class _CodexBundle(NamedTuple):
+    """Final text and raw result of one Codex CLI run."""
+
+    output: str
+    raw_result: Any
+
+
 class CodexTaskToolsMixin:
     """Mixin providing Codex task execution tools."""
 
@@ -25,28 +31,17 @@ class CodexTaskToolsMixin:
         try:
             logger.info("Sending the following task prompt to Codex CLI %s.", task_prompt)
 
-            run_ctx.disallow_interruptions()
-
-            wait_for_result = asyncio.ensure_future(self._a_long_running_task(task_prompt))
-            try:
-                await run_ctx.speech_handle.wait_if_not_interrupted([wait_for_result])
-            except Exception:
-                wait_for_result.cancel()
-                raise
-
             if run_ctx.speech_handle.interrupted:
                 logger.info("Interrupted receiving reply from Codex task with prompt %s", task_prompt)
-                wait_for_result.cancel()
                 return {
                     "output": None,
                     "raw_result": None,
                 }
 
-            result_bundle = wait_for_result.result()
-            output_text = result_bundle.get("output") if isinstance(result_bundle, dict) else result_bundle
-            raw_result = result_bundle.get("raw_result") if isinstance(result_bundle, dict) else None
-            if not isinstance(output_text, str):
-                output_text = self._extract_final_output(raw_result, task_prompt)
+            # With interruptions disallowed the speech handle cannot be interrupted while Codex runs,
+            # so the task is awaited in place; cancelling this tool call cancels it directly.
+            run_ctx.disallow_interruptions()
+            output_text, raw_result = await self._a_long_running_task(task_prompt)
             logger.info("Done receiving Codex reply for task prompt %s, result: %s", task_prompt, output_text)
             return {
                 "output": output_text,
@@ -59,12 +54,9 @@ class CodexTaskToolsMixin:
                 "error": self._handle_tool_error("sending the task to Codex", error),
             }
 
-    async def _a_long_running_task(self, task_prompt: str) -> CodexTaskResult:
+    async def _a_long_running_task(self, task_prompt: str) -> _CodexBundle:
         """Run the Codex task asynchronously and capture the result."""
         results = await self.CodexAgent.send_task(task_prompt)
         output_text = self._extract_final_output(results, task_prompt)
         logger.info("Finished long running Codex task for prompt %s.", task_prompt)
-        return {
-            "output": output_text,
-            "raw_result": results,
-        }
+        return _CodexBundle(output_text, results)
@@ -1,14 +1,20 @@
+import asyncio
 import logging
 import os
-from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
 
 from git import Repo
 from git.exc import GitCommandError, InvalidGitRepositoryError, NoSuchPathError
 from livekit.agents import function_tool
 
+from belya_agents.shared import handle_tool_errors
+
 
 logger = logging.getLogger(__name__)
 
+_HEAD_REF_PREFIX = "ref: refs/heads/"
+
 StatusEntry = Tuple[str, str]
 DiffEntry = Tuple[str, str, str]
 
@@ -83,6 +89,12 @@ def _format_status_list(entries: Iterable[StatusEntry]) -> str:
     return ", ".join(formatted)
 
 
+def _summarize_infos(infos: Iterable[object]) -> str:
+    """Join the non-empty ``summary`` fields of GitPython fetch/push info objects."""
+    summaries = (getattr(info, "summary", None) for info in infos)
+    return ", ".join([summary for summary in summaries if summary])
+
+
 def _format_diff_entries(entries: Iterable[DiffEntry]) -> str:
     formatted: List[str] = []
     for added, removed, path in entries:
@@ -97,153 +109,237 @@ def _format_diff_entries(entries: Iterable[DiffEntry]) -> str:
 class GitFunctionToolsMixin:
     """Mixin that provides git-related function tools for the Codex agent."""
 
+    _repo_lock = threading.Lock()
+    _git_call_lock = threading.Lock()
+
     def _repo(self) -> Repo:
+        """Return the cached repository handle for the current working directory."""
         repo_path = os.getcwd()
-        return Repo(repo_path)
+        with self._repo_lock:
+            cached = getattr(self, "_repo_cache", None)
+            if cached is not None and cached[0] == repo_path:
+                return cached[1]
+            repo = Repo(repo_path)
+            if cached is not None:
+                cached[1].close()
+            setattr(self, "_repo_cache", (repo_path, repo))
+            return repo
+
+    def _refresh_repo(self) -> None:
+        """Drop the cached repository handle so the next call reopens it from disk."""
+        with self._repo_lock:
+            cached = getattr(self, "_repo_cache", None)
+            setattr(self, "_repo_cache", None)
+        if cached is not None:
+            cached[1].close()
+
+    async def _run_git(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Run a blocking GitPython call in a worker thread, one call at a time."""
+
+        def _call() -> Any:
+            with self._git_call_lock:
+                return func(*args, **kwargs)
+
+        return await asyncio.to_thread(_call)
+
+    def _active_branch_name(self, repo: Repo) -> str:
+        """Read the checked-out branch straight from HEAD, deferring to GitPython otherwise.
+
+        The parsed name is reused until HEAD is rewritten; git replaces the file on every
+        update, so its inode and mtime together identify one version of it.
+        """
+        head_path = os.path.join(repo.git_dir, "HEAD")
+        try:
+            head_stat = os.stat(head_path)
+        except OSError:
+            head_key = None
+        else:
+            head_key = (head_path, head_stat.st_ino, head_stat.st_mtime_ns)
+            cached = getattr(self, "_active_branch_cache", None)
+            if cached is not None and cached[0] == head_key:
+                return cached[1]
+        try:
+            with open(head_path, "r", encoding="utf-8") as stream:
+                head = stream.readline().strip()
+        except OSError:
+            head = ""
+        if not head.startswith(_HEAD_REF_PREFIX):
+            return repo.active_branch.name
+        branch_name = head[len(_HEAD_REF_PREFIX):]
+        if head_key is not None:
+            setattr(self, "_active_branch_cache", (head_key, branch_name))
+        return branch_name
+
+    async def _head_names(self, repo: Repo) -> Set[str]:
+        """Return the local branch names as a set, read with a single for-each-ref call.
+
+        Codex and the user create and delete branches outside these tools, and nested refs
+        such as feature/b do not touch the refs/heads mtime, so the names are not cached.
+        """
+        output = await self._run_git(repo.git.for_each_ref, "refs/heads", "--format=%(refname)")
+        return {line[len("refs/heads/"):] for line in output.splitlines() if line.startswith("refs/heads/")}
+
+    async def _branch_exists(self, repo: Repo, branch_name: str) -> bool:
+        """Return whether a local branch exists, checking the single ref rather than listing them all."""
+        try:
+            await self._run_git(repo.git.show_ref, "--verify", "--quiet", f"refs/heads/{branch_name}")
+        except GitCommandError:
+            return False
+        return True
+
+    def _has_tracking_branch(self, repo: Repo, branch_name: str) -> bool:
+        """Return whether the branch has an upstream, re-reading git config only after it changes."""
+        config_path = os.path.join(repo.common_dir, "config")
+        try:
+            config_mtime = os.stat(config_path).st_mtime_ns
+        except OSError:
+            config_mtime = None
+        cache: Dict[str, Tuple[Optional[int], bool]] = getattr(self, "_tracking_cache", None) or {}
+        cached = cache.get(branch_name)
+        if cached is not None and config_mtime is not None and cached[0] == config_mtime:
+            return cached[1]
+        has_tracking = repo.heads[branch_name].tracking_branch() is not None
+        cache[branch_name] = (config_mtime, has_tracking)
+        setattr(self, "_tracking_cache", cache)
+        return has_tracking
 
     @function_tool
+    @handle_tool_errors("initializing a git repository")
     async def git_init(self, path: Optional[str] = None) -> str:
         """Initialize a git repository in the specified directory or the current working directory."""
-        try:
-            target_path = os.path.abspath(path) if path else os.getcwd()
+        target_path = os.path.abspath(path) if path else os.getcwd()
 
-            if os.path.exists(target_path) and not os.path.isdir(target_path):
-                return f"Cannot initialize a git repository because {target_path} is not a directory."
+        if os.path.exists(target_path) and not os.path.isdir(target_path):
+            return f"Cannot initialize a git repository because {target_path} is not a directory."
 
-            if not os.path.exists(target_path):
-                os.makedirs(target_path, exist_ok=True)
+        if not os.path.exists(target_path):
+            os.makedirs(target_path, exist_ok=True)
 
-            try:
-                Repo(target_path)
-            except (InvalidGitRepositoryError, NoSuchPathError):
-                pass
-            else:
-                logger.info("git init skipped; repository already exists at %s", target_path)
-                return f"A git repository already exists at {target_path}."
+        try:
+            Repo(target_path)
+        except (InvalidGitRepositoryError, NoSuchPathError):
+            pass
+        else:
+            logger.info("git init skipped; repository already exists at %s", target_path)
+            return f"A git repository already exists at {target_path}."
 
-            Repo.init(target_path)
-            logger.info("Initialized a new git repository at %s", target_path)
-            return f"Initialized a new git repository at {target_path}."
-        except Exception as error:  # pragma: no cover - handled via _handle_tool_error
-            return self._handle_tool_error("initializing a git repository", error)
+        await self._run_git(Repo.init, target_path)
+        self._refresh_repo()
+        logger.info("Initialized a new git repository at %s", target_path)
+        return f"Initialized a new git repository at {target_path}."
 
     @function_tool
+    @handle_tool_errors("checking git status")
     async def status(self) -> str:
         """Summarize the current git status including staged and unstaged files."""
-        try:
-            repo = self._repo()
-            if getattr(repo.head, "is_detached", False):
-                current_branch = "a detached HEAD"
-            else:
-                current_branch = repo.active_branch.name
-
-            short_output = repo.git.status("--short")
-            status_sections = _parse_short_status(short_output)
-
-            staged = status_sections["staged"]
-            unstaged = status_sections["unstaged"]
-            untracked = status_sections["untracked"]
-            ignored = status_sections["ignored"]
-
-            if not (staged or unstaged or untracked):
-                logger.info("git status: clean working tree on %s", current_branch)
-                return f"The working tree on {current_branch} is clean with no staged or pending changes."
-
-            messages: List[str] = [f"On {current_branch}."]
-            if staged:
-                messages.append(f"Staged changes: {_format_status_list(staged)}.")
-            else:
-                messages.append("No staged changes.")
-
-            if unstaged:
-                messages.append(f"Unstaged changes: {_format_status_list(unstaged)}.")
-            else:
-                messages.append("No unstaged changes.")
-
-            if untracked:
-                untracked_list = ", ".join(path for path, _ in untracked)
-                messages.append(f"Untracked files: {untracked_list}.")
-
-            if ignored:
-                ignored_list = ", ".join(path for path, _ in ignored)
-                messages.append(f"Ignored files (left untouched): {ignored_list}.")
-
-            summary = " ".join(messages)
-            logger.info("git status summary: %s", summary)
-            return summary
-        except Exception as error:  # pragma: no cover - handled via _handle_tool_error
-            return self._handle_tool_error("checking git status", error)
+        repo = self._repo()
+        if getattr(repo.head, "is_detached", False):
+            current_branch = "a detached HEAD"
+        else:
+            current_branch = self._active_branch_name(repo)
+
+        short_output = await self._run_git(repo.git.status, "--short")
+        status_sections = _parse_short_status(short_output)
+
+        staged = status_sections["staged"]
+        unstaged = status_sections["unstaged"]
+        untracked = status_sections["untracked"]
+        ignored = status_sections["ignored"]
+
+        if not (staged or unstaged or untracked):
+            logger.info("git status: clean working tree on %s", current_branch)
+            return f"The working tree on {current_branch} is clean with no staged or pending changes."
+
+        messages: List[str] = [f"On {current_branch}."]
+        if staged:
+            messages.append(f"Staged changes: {_format_status_list(staged)}.")
+        else:
+            messages.append("No staged changes.")
+
+        if unstaged:
+            messages.append(f"Unstaged changes: {_format_status_list(unstaged)}.")
+        else:
+            messages.append("No unstaged changes.")
+
+        if untracked:
+            untracked_list = ", ".join(path for path, _ in untracked)
+            messages.append(f"Untracked files: {untracked_list}.")
+
+        if ignored:
+            ignored_list = ", ".join(path for path, _ in ignored)
+            messages.append(f"Ignored files (left untouched): {ignored_list}.")
+
+        summary = " ".join(messages)
+        logger.info("git status summary: %s", summary)
+        return summary
 
     @function_tool
+    @handle_tool_errors("staging changes")
     async def add(self, paths: Optional[Sequence[str]] = None) -> str:
         """Stage specific paths or everything when no paths are provided."""
-        try:
-            repo = self._repo()
-            if not paths:
-                repo.git.add(all=True)
-                logger.info("Staged all changes in repository %s", repo.working_dir)
-                return "Staged all tracked and untracked changes."
+        repo = self._repo()
+        if not paths:
+            await self._run_git(repo.git.add, all=True)
+            logger.info("Staged all changes in repository %s", repo.working_dir)
+            return "Staged all tracked and untracked changes."
 
-            normalized_paths = [path.strip() for path in paths if path.strip()]
-            if not normalized_paths:
-                return "No paths were provided to stage."
+        normalized_paths = [path.strip() for path in paths if path.strip()]
+        if not normalized_paths:
+            return "No paths were provided to stage."
 
-            repo.git.add(*normalized_paths)
-            staged_list = ", ".join(normalized_paths)
-            logger.info("Staged paths: %s", staged_list)
-            return f"Staged the following paths: {staged_list}."
-        except Exception as error:  # pragma: no cover - handled via _handle_tool_error
-            return self._handle_tool_error("staging changes", error)
+        await self._run_git(repo.git.add, *normalized_paths)
+        staged_list = ", ".join(normalized_paths)
+        logger.info("Staged paths: %s", staged_list)
+        return f"Staged the following paths: {staged_list}."
 
     @function_tool
+    @handle_tool_errors("summarizing diffs")
     async def diff(self) -> str:
         """Summarize staged and unstaged diffs with line change counts and patches."""
-        try:
-            repo = self._repo()
-            staged_output = repo.git.diff("--cached", "--numstat")
-            unstaged_output = repo.git.diff("--numstat")
-            staged_patch = repo.git.diff("--cached")
-            unstaged_patch = repo.git.diff()
-
-            staged_entries = _parse_numstat(staged_output)
-            unstaged_entries = _parse_numstat(unstaged_output)
-            untracked_files = repo.untracked_files
-
-            messages: List[str] = []
-            if staged_entries:
-                messages.append(f"Staged changes: {_format_diff_entries(staged_entries)}.")
-            else:
-                messages.append("No staged diffs.")
-
-            if unstaged_entries:
-                messages.append(f"Unstaged changes: {_format_diff_entries(unstaged_entries)}.")
-            else:
-                messages.append("No unstaged diffs.")
-
-            if untracked_files:
-                untracked_list = ", ".join(untracked_files)
-                messages.append(f"Untracked files (not part of the diff): {untracked_list}.")
-
-            if not staged_entries and not unstaged_entries and not untracked_files:
-                logger.info("git diff: no changes detected")
-                return "There are no staged or unstaged diffs; the working tree is clean."
-
-            diff_details: List[str] = []
-            if staged_patch.strip():
-                diff_details.append("Staged diff:\n" + staged_patch.strip())
-            if unstaged_patch.strip():
-                diff_details.append("Unstaged diff:\n" + unstaged_patch.strip())
-
-            summary = " ".join(messages)
-            logger.info("git diff summary: %s", summary)
-            if diff_details:
-                detail_block = "\n\n".join(diff_details)
-                return f"{summary}\n\n{detail_block}"
-            return summary
-        except Exception as error:  # pragma: no cover - handled via _handle_tool_error
-            return self._handle_tool_error("summarizing diffs", error)
+        repo = self._repo()
+        staged_output = await self._run_git(repo.git.diff, "--cached", "--numstat")
+        unstaged_output = await self._run_git(repo.git.diff, "--numstat")
+        staged_patch = await self._run_git(repo.git.diff, "--cached")
+        unstaged_patch = await self._run_git(repo.git.diff)
+
+        staged_entries = _parse_numstat(staged_output)
+        unstaged_entries = _parse_numstat(unstaged_output)
+        untracked_files = await self._run_git(lambda: repo.untracked_files)
+
+        messages: List[str] = []
+        if staged_entries:
+            messages.append(f"Staged changes: {_format_diff_entries(staged_entries)}.")
+        else:
+            messages.append("No staged diffs.")
+
+        if unstaged_entries:
+            messages.append(f"Unstaged changes: {_format_diff_entries(unstaged_entries)}.")
+        else:
+            messages.append("No unstaged diffs.")
+
+        if untracked_files:
+            untracked_list = ", ".join(untracked_files)
+            messages.append(f"Untracked files (not part of the diff): {untracked_list}.")
+
+        if not staged_entries and not unstaged_entries and not untracked_files:
+            logger.info("git diff: no changes detected")
+            return "There are no staged or unstaged diffs; the working tree is clean."
+
+        diff_details: List[str] = []
+        if staged_patch.strip():
+            diff_details.append("Staged diff:\n" + staged_patch.strip())
+        if unstaged_patch.strip():
+            diff_details.append("Unstaged diff:\n" + unstaged_patch.strip())
+
+        summary = " ".join(messages)
+        logger.info("git diff summary: %s", summary)
+        if diff_details:
+            detail_block = "\n\n".join(diff_details)
+            return f"{summary}\n\n{detail_block}"
+        return summary
 
     @function_tool
+    @handle_tool_errors("restoring files")
     async def restore(self, paths: Optional[Sequence[str]] = None, unstage: bool = False) -> str:
         """Restore files by discarding working tree changes or unstaging them."""
         try:
@@ -253,12 +349,12 @@ class GitFunctionToolsMixin:
                 return "No paths were provided to restore."
 
             if unstage:
-                repo.git.restore("--staged", *target_paths)
+                await self._run_git(repo.git.restore, "--staged", *target_paths)
                 restored = ", ".join(target_paths)
                 logger.info("Unstaged paths: %s", restored)
                 return f"Unstaged the following paths: {restored}."
 
-            repo.git.restore("--worktree", "--source=HEAD", *target_paths)
+            await self._run_git(repo.git.restore, "--worktree", "--source=HEAD", *target_paths)
             restored = ", ".join(target_paths)
             logger.info("Discarded worktree changes for paths: %s", restored)
             return f"Discarded local modifications for: {restored}."
@@ -268,11 +364,10 @@ class GitFunctionToolsMixin:
                     "Git could not restore untracked files. "
                     "Please remove them manually if you want to discard them."
                 )
-            return self._handle_tool_error("restoring files", error)
-        except Exception as error:  # pragma: no cover - handled via _handle_tool_error
-            return self._handle_tool_error("restoring files", error)
+            raise
 
     @function_tool
+    @handle_tool_errors("resetting changes")
     async def reset(
         self,
         commit: Optional[str] = None,
@@ -280,36 +375,34 @@ class GitFunctionToolsMixin:
         mode: str = "mixed",
     ) -> str:
         """Reset the current branch or unstage specific paths."""
-        try:
-            repo = self._repo()
-            commitish = commit or "HEAD"
-
-            if paths:
-                normalized_paths = [path.strip() for path in paths if path.strip()]
-                if not normalized_paths:
-                    return "No paths were provided to reset."
-                repo.git.reset(commitish, *normalized_paths)
-                staged_list = ", ".join(normalized_paths)
-                logger.info("Unstaged paths %s back to %s", staged_list, commitish)
-                return f"Unstaged {staged_list} back to {commitish}."
-
-            allowed_modes = {"soft", "mixed", "hard", "keep", "merge"}
-            normalized_mode = mode.lower() if mode else "mixed"
-            if normalized_mode not in allowed_modes:
-                allowed = ", ".join(sorted(allowed_modes))
-                return f"Reset mode '{mode}' is not supported. Please use one of: {allowed}."
-
-            args: List[str] = [f"--{normalized_mode}"]
-            if commit:
-                args.append(commit)
-            repo.git.reset(*args)
-            commit_target = commit or "the current HEAD"
-            logger.info("Performed git reset --%s %s", normalized_mode, commit_target)
-            return f"Reset the current branch with --{normalized_mode} to {commit_target}."
-        except Exception as error:  # pragma: no cover - handled via _handle_tool_error
-            return self._handle_tool_error("resetting changes", error)
+        repo = self._repo()
+        commitish = commit or "HEAD"
+
+        if paths:
+            normalized_paths = [path.strip() for path in paths if path.strip()]
+            if not normalized_paths:
+                return "No paths were provided to reset."
+            await self._run_git(repo.git.reset, commitish, *normalized_paths)
+            staged_list = ", ".join(normalized_paths)
+            logger.info("Unstaged paths %s back to %s", staged_list, commitish)
+            return f"Unstaged {staged_list} back to {commitish}."
+
+        allowed_modes = {"soft", "mixed", "hard", "keep", "merge"}
+        normalized_mode = mode.lower() if mode else "mixed"
+        if normalized_mode not in allowed_modes:
+            allowed = ", ".join(sorted(allowed_modes))
+            return f"Reset mode '{mode}' is not supported. Please use one of: {allowed}."
+
+        args: List[str] = [f"--{normalized_mode}"]
+        if commit:
+            args.append(commit)
+        await self._run_git(repo.git.reset, *args)
+        commit_target = commit or "the current HEAD"
+        logger.info("Performed git reset --%s %s", normalized_mode, commit_target)
+        return f"Reset the current branch with --{normalized_mode} to {commit_target}."
 
     @function_tool
+    @handle_tool_errors("running git stash")
     async def stash(
         self,
         action: str = "push",
@@ -318,45 +411,43 @@ class GitFunctionToolsMixin:
         include_untracked: bool = False,
     ) -> str:
         """Manage git stash entries (push, list, pop, apply, drop, or clear)."""
-        try:
-            repo = self._repo()
-            normalized_action = action.lower().strip() if action else "push"
-            stash_arguments: List[str]
-
-            if normalized_action in {"push", "save"}:
-                stash_arguments = ["push"]
-                if include_untracked:
-                    stash_arguments.append("--include-untracked")
-                if message:
-                    stash_arguments.extend(["-m", message])
-                output = repo.git.stash(*stash_arguments)
-                logger.info("Created stash entry: %s", output.strip())
-                return f"Created a new stash entry. Git replied: {output.strip()}"
-
-            if normalized_action == "list":
-                output = repo.git.stash("list")
-                response = output.strip() or "No stash entries found."
-                logger.info("Stash list retrieved")
-                return response
-
-            if normalized_action in {"pop", "apply", "drop"}:
-                target = stash_ref or "stash@{0}"
-                output = repo.git.stash(normalized_action, target)
-                logger.info("Performed stash %s on %s", normalized_action, target)
-                return f"Ran `git stash {normalized_action} {target}`. Git replied: {output.strip()}"
-
-            if normalized_action == "clear":
-                repo.git.stash("clear")
-                logger.info("Cleared all stash entries")
-                return "Cleared all stash entries."
-
-            return (
-                "Unsupported stash action. Please use push, list, pop, apply, drop, or clear."
-            )
-        except Exception as error:  # pragma: no cover - handled via _handle_tool_error
-            return self._handle_tool_error("running git stash", error)
+        repo = self._repo()
+        normalized_action = action.lower().strip() if action else "push"
+        stash_arguments: List[str]
+
+        if normalized_action in {"push", "save"}:
+            stash_arguments = ["push"]
+            if include_untracked:
+                stash_arguments.append("--include-untracked")
+            if message:
+                stash_arguments.extend(["-m", message])
+            output = await self._run_git(repo.git.stash, *stash_arguments)
+            logger.info("Created stash entry: %s", output.strip())
+            return f"Created a new stash entry. Git replied: {output.strip()}"
+
+        if normalized_action == "list":
+            output = await self._run_git(repo.git.stash, "list")
+            response = output.strip() or "No stash entries found."
+            logger.info("Stash list retrieved")
+            return response
+
+        if normalized_action in {"pop", "apply", "drop"}:
+            target = stash_ref or "stash@{0}"
+            output = await self._run_git(repo.git.stash, normalized_action, target)
+            logger.info("Performed stash %s on %s", normalized_action, target)
+            return f"Ran `git stash {normalized_action} {target}`. Git replied: {output.strip()}"
+
+        if normalized_action == "clear":
+            await self._run_git(repo.git.stash, "clear")
+            logger.info("Cleared all stash entries")
+            return "Cleared all stash entries."
+
+        return (
+            "Unsupported stash action. Please use push, list, pop, apply, drop, or clear."
+        )
 
     @function_tool
+    @handle_tool_errors("merging branches")
     async def merge(
         self,
         source_branch: str,
@@ -367,7 +458,7 @@ class GitFunctionToolsMixin:
         """Merge a source branch into the current (or specified target) branch."""
         try:
             repo = self._repo()
-            current_branch = repo.active_branch.name
+            current_branch = self._active_branch_name(repo)
             destination = target_branch or current_branch
 
             if destination != current_branch:
@@ -375,8 +466,7 @@ class GitFunctionToolsMixin:
                     f"You are currently on {current_branch}. Please switch to {destination} before merging."
                 )
 
-            available = [head.name for head in repo.heads]
-            if source_branch not in available:
+            if not await self._branch_exists(repo, source_branch):
                 return f"The branch {source_branch} does not exist locally."
 
             if source_branch == destination:
@@ -389,7 +479,7 @@ class GitFunctionToolsMixin:
                 merge_args.append("--squash")
             merge_args.append(source_branch)
 
-            output = repo.git.merge(*merge_args)
+            output = await self._run_git(repo.git.merge, *merge_args)
             cleaned_output = output.strip()
             logger.info(
                 "Merged branch %s into %s. Output: %s", source_branch, destination, cleaned_output
@@ -405,229 +495,225 @@ class GitFunctionToolsMixin:
                     "Merge resulted in conflicts. Please resolve them manually and commit the merge. "
                     f"Git reported: {stderr or error}"
                 )
-            return self._handle_tool_error("merging branches", error)
-        except Exception as error:  # pragma: no cover - handled via _handle_tool_error
-            return self._handle_tool_error("merging branches", error)
+            raise
 
     @function_tool
+    @handle_tool_errors("moving files")
     async def mv(self, source: str, destination: str) -> str:
         """Rename or move a tracked file."""
-        try:
-            repo = self._repo()
-            if not source or not destination:
-                return "Both source and destination paths are required to move a file."
-            repo.git.mv(source, destination)
-            logger.info("Renamed %s to %s", source, destination)
-            return f"Moved {source} to {destination}."
-        except GitCommandError as error:
-            return self._handle_tool_error("moving files", error)
-        except Exception as error:  # pragma: no cover - handled via _handle_tool_error
-            return self._handle_tool_error("moving files", error)
+        repo = self._repo()
+        if not source or not destination:
+            return "Both source and destination paths are required to move a file."
+        await self._run_git(repo.git.mv, source, destination)
+        logger.info("Renamed %s to %s", source, destination)
+        return f"Moved {source} to {destination}."
 
     @function_tool
+    @handle_tool_errors("removing files")
     async def rm(self, paths: Sequence[str], force: bool = False) -> str:
         """Remove tracked files from the working tree and index."""
-        try:
-            repo = self._repo()
-            targets = [path.strip() for path in paths if path and path.strip()]
-            if not targets:
-                return "Provide at least one path to remove."
-            args: List[str] = []
-            if force:
-                args.append("-f")
-            repo.git.rm(*(args + targets))
-            removed_list = ", ".join(targets)
-            logger.info("Removed tracked files: %s", removed_list)
-            return f"Removed the following tracked files: {removed_list}."
-        except GitCommandError as error:
-            return self._handle_tool_error("removing files", error)
-        except Exception as error:  # pragma: no cover - handled via _handle_tool_error
-            return self._handle_tool_error("removing files", error)
+        repo = self._repo()
+        targets = [path.strip() for path in paths if path and path.strip()]
+        if not targets:
+            return "Provide at least one path to remove."
+        args: List[str] = []
+        if force:
+            args.append("-f")
+        await self._run_git(repo.git.rm, *(args + targets))
+        removed_list = ", ".join(targets)
+        logger.info("Removed tracked files: %s", removed_list)
+        return f"Removed the following tracked files: {removed_list}."
 
     @function_tool
+    @handle_tool_errors("cleaning untracked files")
     async def clean(self, directories: bool = False, force: bool = False) -> str:
         """Remove untracked files (and optionally directories)."""
-        try:
-            repo = self._repo()
-            if not force:
-                return (
-                    "Cleaning requires force=True to avoid accidental deletions. "
-                    "Re-run with force=True if you are sure."
-                )
-            args = ["-f"]
-            if directories:
-                args.append("-d")
-            output = repo.git.clean(*args)
-            cleaned = output.strip() or "Nothing to clean."
-            logger.info("Cleaned untracked items. Git replied: %s", cleaned)
-            return cleaned
-        except GitCommandError as error:
-            return self._handle_tool_error("cleaning untracked files", error)
-        except Exception as error:  # pragma: no cover - handled via _handle_tool_error
-            return self._handle_tool_error("cleaning untracked files", error)
+        repo = self._repo()
+        if not force:
+            return (
+                "Cleaning requires force=True to avoid accidental deletions. "
+                "Re-run with force=True if you are sure."
+            )
+        args = ["-f"]
+        if directories:
+            args.append("-d")
+        output = await self._run_git(repo.git.clean, *args)
+        cleaned = output.strip() or "Nothing to clean."
+        logger.info("Cleaned untracked items. Git replied: %s", cleaned)
+        return cleaned
 
     @function_tool
+    @handle_tool_errors("checking the current branch")
     async def check_current_branch(self) -> str:
         """Called when user wants to know the current branch in the repo."""
-        try:
-            repo = self._repo()
-            current_branch = repo.active_branch.name
-            logger.info(
-                "Current branch in repo at %s is %s", repo.working_dir, current_branch
-            )
-            return f"Current branch in the repo is {current_branch}."
-        except Exception as error:  # pragma: no cover - handled via _handle_tool_error
-            return self._handle_tool_error("checking the current branch", error)
+        repo = self._repo()
+        current_branch = self._active_branch_name(repo)
+        logger.info(
+            "Current branch in repo at %s is %s", repo.working_dir, current_branch
+        )
+        return f"Current branch in the repo is {current_branch}."
 
     @function_tool
+    @handle_tool_errors("creating a new branch")
     async def create_branch(self, branch_name: str) -> str:
         """Called when user wants to create a new branch in the repo for Codex to work on."""
+        repo = self._repo()
+        # update-ref does not apply branch-name rules (it accepts HEAD or -x), so check the
+        # name the way checkout -b does. --branch also expands @{-1}, which is not a new name.
         try:
-            repo = self._repo()
-            if branch_name in [head.name for head in repo.heads]:
-                logger.info(
-                    "Branch %s already exists in repo at %s", branch_name, repo.working_dir
-                )
-                return (
-                    f"The branch {branch_name} already exists. "
-                    "Please pick a different name or switch to it."
-                )
-            repo.git.checkout("HEAD", b=branch_name)
+            checked_name = await self._run_git(repo.git.check_ref_format, "--branch", branch_name)
+        except GitCommandError:
+            checked_name = None
+        if checked_name != branch_name:
+            logger.info("Rejected invalid branch name %s in repo at %s", branch_name, repo.working_dir)
+            return f"{branch_name} is not a valid branch name. Please pick a different name."
+
+        try:
+            previous_branch = self._active_branch_name(repo)
+        except TypeError:
+            # Detached HEAD: name the commit in the reflog messages, as git checkout does.
+            previous_branch = repo.head.commit.hexsha
+        branch_ref = f"refs/heads/{branch_name}"
+
+        def _create_and_switch() -> None:
+            # The new branch points at HEAD, so no working-tree update is needed; plumbing skips
+            # checkout's index refresh. The empty old value makes update-ref refuse an existing ref.
+            repo.git.update_ref("-m", f"branch: Created from {previous_branch}", branch_ref, "HEAD", "")
+            repo.git.symbolic_ref("-m", f"checkout: moving from {previous_branch} to {branch_name}", "HEAD", branch_ref)
+
+        if await self._branch_exists(repo, branch_name):
             logger.info(
-                "Created and checked out new branch %s in repo at %s",
-                branch_name,
-                repo.working_dir,
+                "Branch %s already exists in repo at %s", branch_name, repo.working_dir
+            )
+            return (
+                f"The branch {branch_name} already exists. "
+                "Please pick a different name or switch to it."
             )
-            return f"Created and checked out new branch {branch_name} in the repo."
-        except Exception as error:  # pragma: no cover - handled via _handle_tool_error
-            return self._handle_tool_error("creating a new branch", error)
+
+        await self._run_git(_create_and_switch)
+        logger.info(
+            "Created and checked out new branch %s in repo at %s",
+            branch_name,
+            repo.working_dir,
+        )
+        return f"Created and checked out new branch {branch_name} in the repo."
 
     @function_tool
+    @handle_tool_errors("committing changes")
     async def commit_changes(self, commit_message: str) -> str:
         """Called when user wants to commit all current changes with a message."""
-        try:
-            repo = self._repo()
-            if not repo.is_dirty(untracked_files=True):
-                logger.info("No changes to commit in repo at %s", repo.working_dir)
-                return "There are no changes to commit."
-
-            repo.git.add(all=True)
-            commit = repo.index.commit(commit_message)
-            logger.info(
-                "Committed changes in repo at %s with message '%s'. Commit id: %s",
-                repo.working_dir,
-                commit_message,
-                commit.hexsha,
-            )
-            return f"Committed changes with message: {commit_message}."
-        except Exception as error:  # pragma: no cover - handled via _handle_tool_error
-            return self._handle_tool_error("committing changes", error)
+        repo = self._repo()
+        # A single porcelain status covers staged, unstaged and untracked changes at once.
+        porcelain = await self._run_git(
+            repo.git.status, "--porcelain", "-z", "--untracked-files=normal"
+        )
+        if not porcelain:
+            logger.info("No changes to commit in repo at %s", repo.working_dir)
+            return "There are no changes to commit."
+
+        await self._run_git(repo.git.add, all=True)
+        commit = await self._run_git(repo.index.commit, commit_message)
+        logger.info(
+            "Committed changes in repo at %s with message '%s'. Commit id: %s",
+            repo.working_dir,
+            commit_message,
+            commit.hexsha,
+        )
+        return f"Committed changes with message: {commit_message}."
 
     @function_tool
+    @handle_tool_errors("pulling updates")
     async def pull_updates(
         self, remote_name: str = "origin", branch_name: Optional[str] = None
     ) -> str:
         """Called when user wants to pull the latest updates from the remote branch."""
-        try:
-            repo = self._repo()
-            active_branch = repo.active_branch.name
-            branch_to_pull = branch_name or active_branch
-            remote = repo.remote(remote_name)
-            pull_infos = remote.pull(branch_to_pull)
-            summaries = ", ".join(
-                info.summary for info in pull_infos if getattr(info, "summary", None)
-            )
-            logger.info(
-                "Pulled updates from %s/%s in repo at %s. Summaries: %s",
-                remote_name,
-                branch_to_pull,
-                repo.working_dir,
-                summaries,
-            )
-            if not summaries:
-                summaries = "Pull completed with no additional details."
-            return f"Pulled latest updates from {remote_name}/{branch_to_pull}. {summaries}"
-        except Exception as error:  # pragma: no cover - handled via _handle_tool_error
-            return self._handle_tool_error("pulling updates", error)
+        repo = self._repo()
+        branch_to_pull = branch_name or self._active_branch_name(repo)
+        remote = repo.remote(remote_name)
+        pull_infos = await self._run_git(remote.pull, branch_to_pull)
+        summaries = _summarize_infos(pull_infos)
+        logger.info(
+            "Pulled updates from %s/%s in repo at %s. Summaries: %s",
+            remote_name,
+            branch_to_pull,
+            repo.working_dir,
+            summaries,
+        )
+        if not summaries:
+            summaries = "Pull completed with no additional details."
+        return f"Pulled latest updates from {remote_name}/{branch_to_pull}. {summaries}"
 
     @function_tool
+    @handle_tool_errors("fetching updates")
     async def fetch_updates(self, remote_name: str = "origin") -> str:
         """Called when user wants to fetch updates from the remote without merging."""
-        try:
-            repo = self._repo()
-            remote = repo.remote(remote_name)
-            fetch_infos = remote.fetch()
-            summaries = ", ".join(
-                info.summary for info in fetch_infos if getattr(info, "summary", None)
-            )
-            logger.info(
-                "Fetched updates from %s in repo at %s. Summaries: %s",
-                remote_name,
-                repo.working_dir,
-                summaries,
-            )
-            if not summaries:
-                summaries = "Fetch completed with no additional details."
-            return f"Fetched updates from {remote_name}. {summaries}"
-        except Exception as error:  # pragma: no cover - handled via _handle_tool_error
-            return self._handle_tool_error("fetching updates", error)
+        repo = self._repo()
+        remote = repo.remote(remote_name)
+        fetch_infos = await self._run_git(remote.fetch)
+        summaries = _summarize_infos(fetch_infos)
+        logger.info(
+            "Fetched updates from %s in repo at %s. Summaries: %s",
+            remote_name,
+            repo.working_dir,
+            summaries,
+        )
+        if not summaries:
+            summaries = "Fetch completed with no additional details."
+        return f"Fetched updates from {remote_name}. {summaries}"
 
     @function_tool
+    @handle_tool_errors("listing branches")
     async def list_branches(self) -> str:
         """Called when user wants to list all local branches."""
-        try:
-            repo = self._repo()
-            branches = [head.name for head in repo.heads]
-            current_branch = repo.active_branch.name
-
-            if not branches:
-                logger.info("No branches found in repo at %s", repo.working_dir)
-                return "No branches found in the repository."
-
-            formatted_branches = [
-                f"{name} (current)" if name == current_branch else name for name in branches
-            ]
-            branch_list = ", ".join(formatted_branches)
-            logger.info("Listed branches in repo at %s: %s", repo.working_dir, branch_list)
-            return f"The local branches are: {branch_list}."
-        except Exception as error:  # pragma: no cover - handled via _handle_tool_error
-            return self._handle_tool_error("listing branches", error)
+        repo = self._repo()
+        branches = sorted(await self._head_names(repo))
+        current_branch = self._active_branch_name(repo)
+
+        if not branches:
+            logger.info("No branches found in repo at %s", repo.working_dir)
+            return "No branches found in the repository."
+
+        formatted_branches = [
+            f"{name} (current)" if name == current_branch else name for name in branches
+        ]
+        branch_list = ", ".join(formatted_branches)
+        logger.info("Listed branches in repo at %s: %s", repo.working_dir, branch_list)
+        return f"The local branches are: {branch_list}."
 
     @function_tool
+    @handle_tool_errors("deleting the branch")
     async def delete_branch(self, branch_name: str, force: bool = False) -> str:
         """Called when user wants to delete a local branch."""
-        try:
-            repo = self._repo()
-            current_branch = repo.active_branch.name
-            if branch_name == current_branch:
-                logger.info(
-                    "Attempted to delete current branch %s in repo at %s",
-                    branch_name,
-                    repo.working_dir,
-                )
-                return "Cannot delete the branch you are currently on. Please switch to another branch first."
-
-            if branch_name not in [head.name for head in repo.heads]:
-                logger.info(
-                    "Attempted to delete non-existent branch %s in repo at %s",
-                    branch_name,
-                    repo.working_dir,
-                )
-                return f"The branch {branch_name} does not exist."
+        repo = self._repo()
+        current_branch = self._active_branch_name(repo)
+        if branch_name == current_branch:
+            logger.info(
+                "Attempted to delete current branch %s in repo at %s",
+                branch_name,
+                repo.working_dir,
+            )
+            return "Cannot delete the branch you are currently on. Please switch to another branch first."
 
-            flag = "-D" if force else "-d"
-            repo.git.branch(flag, branch_name)
+        if not await self._branch_exists(repo, branch_name):
             logger.info(
-                "Deleted branch %s in repo at %s with force=%s",
+                "Attempted to delete non-existent branch %s in repo at %s",
                 branch_name,
                 repo.working_dir,
-                force,
             )
-            return f"Deleted branch {branch_name}."
-        except Exception as error:  # pragma: no cover - handled via _handle_tool_error
-            return self._handle_tool_error("deleting the branch", error)
+            return f"The branch {branch_name} does not exist."
+
+        flag = "-D" if force else "-d"
+        await self._run_git(repo.git.branch, flag, branch_name)
+        logger.info(
+            "Deleted branch %s in repo at %s with force=%s",
+            branch_name,
+            repo.working_dir,
+            force,
+        )
+        return f"Deleted branch {branch_name}."
 
     @function_tool
+    @handle_tool_errors("pushing the branch")
     async def push_branch(
         self,
         remote_name: str = "origin",
@@ -635,75 +721,68 @@ class GitFunctionToolsMixin:
         set_upstream: Optional[bool] = None,
     ) -> str:
         """Called when user wants to push the current or specified branch to a remote."""
-        try:
-            repo = self._repo()
-            remote = repo.remote(remote_name)
-
-            active_branch = repo.active_branch
-            branch_to_push = branch_name or active_branch.name
-
-            if branch_to_push not in [head.name for head in repo.heads]:
-                logger.info(
-                    "Attempted to push non-existent branch %s in repo at %s",
-                    branch_to_push,
-                    repo.working_dir,
-                )
-                return f"The branch {branch_to_push} does not exist locally."
-
-            head_ref = next(head for head in repo.heads if head.name == branch_to_push)
-            tracking_branch = head_ref.tracking_branch()
-
-            should_set_upstream = (
-                set_upstream if set_upstream is not None else tracking_branch is None
-            )
+        repo = self._repo()
+        remote = repo.remote(remote_name)
 
-            if should_set_upstream:
-                push_result = remote.push(f"{branch_to_push}:{branch_to_push}", set_upstream=True)
-            else:
-                push_result = remote.push(branch_to_push)
+        branch_to_push = branch_name or self._active_branch_name(repo)
 
-            summaries = ", ".join(
-                info.summary for info in push_result if getattr(info, "summary", None)
-            )
+        if not await self._branch_exists(repo, branch_to_push):
             logger.info(
-                "Pushed branch %s to %s from repo at %s. Set upstream: %s. Summaries: %s",
+                "Attempted to push non-existent branch %s in repo at %s",
                 branch_to_push,
-                remote_name,
                 repo.working_dir,
-                should_set_upstream,
-                summaries,
             )
-            if not summaries:
-                summaries = "Push completed with no additional details."
+            return f"The branch {branch_to_push} does not exist locally."
+
+        should_set_upstream = (
+            set_upstream
+            if set_upstream is not None
+            else not self._has_tracking_branch(repo, branch_to_push)
+        )
 
-            upstream_msg = (
-                "Upstream branch configured."
-                if should_set_upstream
-                else "Used existing upstream."
+        if should_set_upstream:
+            push_result = await self._run_git(
+                remote.push, f"{branch_to_push}:{branch_to_push}", set_upstream=True
             )
-            return f"Pushed {branch_to_push} to {remote_name}. {upstream_msg} {summaries}"
-        except Exception as error:  # pragma: no cover - handled via _handle_tool_error
-            return self._handle_tool_error("pushing the branch", error)
+        else:
+            push_result = await self._run_git(remote.push, branch_to_push)
+
+        summaries = _summarize_infos(push_result)
+        logger.info(
+            "Pushed branch %s to %s from repo at %s. Set upstream: %s. Summaries: %s",
+            branch_to_push,
+            remote_name,
+            repo.working_dir,
+            should_set_upstream,
+            summaries,
+        )
+        if not summaries:
+            summaries = "Push completed with no additional details."
+
+        upstream_msg = (
+            "Upstream branch configured."
+            if should_set_upstream
+            else "Used existing upstream."
+        )
+        return f"Pushed {branch_to_push} to {remote_name}. {upstream_msg} {summaries}"
 
     @function_tool
+    @handle_tool_errors("switching branches")
     async def switch_branch(self, branch_name: str) -> str:
         """Called when user wants to switch to an existing branch."""
-        try:
-            repo = self._repo()
-            if branch_name not in [head.name for head in repo.heads]:
-                logger.info(
-                    "Attempted to switch to non-existent branch %s in repo at %s",
-                    branch_name,
-                    repo.working_dir,
-                )
-                return f"The branch {branch_name} does not exist."
-
-            repo.git.checkout(branch_name)
+        repo = self._repo()
+        if not await self._branch_exists(repo, branch_name):
             logger.info(
-                "Switched to branch %s in repo at %s",
+                "Attempted to switch to non-existent branch %s in repo at %s",
                 branch_name,
                 repo.working_dir,
             )
-            return f"Switched to branch {branch_name}."
-        except Exception as error:  # pragma: no cover - handled via _handle_tool_error
-            return self._handle_tool_error("switching branches", error)
+            return f"The branch {branch_name} does not exist."
+
+        await self._run_git(repo.git.checkout, branch_name)
+        logger.info(
+            "Switched to branch %s in repo at %s",
+            branch_name,
+            repo.working_dir,
+        )
+        return f"Switched to branch {branch_name}."
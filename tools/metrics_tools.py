@@ -1,27 +1,151 @@
+import asyncio
+import functools
 import logging
-import math
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, List, Optional, Set, Tuple
 
 
 logger = logging.getLogger(__name__)
 
+# Substring terms that identify each usage metric inside flattened payload paths,
+# highest-priority term set first.
+_USAGE_METRIC_TERMS: Tuple[Tuple[str, Tuple[Tuple[str, ...], ...]], ...] = (
+    ("total_tokens", (("total", "token"),)),
+    ("delta_tokens", (("delta", "token"), ("tokens", "used"), ("used", "token"))),
+    ("five_hour_used", (("five", "hour", "used"), ("5", "hour", "used"))),
+    ("five_hour_limit", (("five", "hour", "limit"), ("5", "hour", "limit"))),
+    ("five_hour_remaining", (("five", "hour", "remaining"), ("5", "hour", "remaining"))),
+    ("weekly_used", (("week", "used"),)),
+    ("weekly_limit", (("week", "limit"),)),
+    ("weekly_remaining", (("week", "remaining"),)),
+)
+
+_WINDOW_FIELDS = ("used", "limit", "remaining", "last_updated")
+
+# Result attributes that may carry usage payloads, in merge order.
+_USAGE_PAYLOAD_ATTRIBUTES = ("metrics", "usage", "usage_metrics", "token_usage", "rate_limits", "metadata")
+
+# Keys of a flat usage payload whose metrics can be read directly; none of them
+# match a rate-limit window or delta term set in _USAGE_METRIC_TERMS.
+_FLAT_USAGE_KEYS = frozenset({"requests", "input_tokens", "output_tokens", "total_tokens"})
+
+
+_WINDOW_LABELS = (("five_hour", "5-hour"), ("weekly", "weekly"))
+
+# Shared fallback for missing metadata sections; lookups only, never mutate it.
+_EMPTY: Dict[str, Any] = {}
+
+_WindowReading = Optional[Tuple[Any, Any, Any]]
+
+
+def _window_readings(token_usage: Dict[str, Any]) -> Tuple[_WindowReading, ...]:
+    """Return ``(limit, used, remaining)`` per window, or None where the window is not a dict."""
+    readings = []
+    for window_key, _ in _WINDOW_LABELS:
+        window = token_usage.get(window_key, {})
+        if isinstance(window, dict):
+            readings.append((window.get("limit"), window.get("used"), window.get("remaining")))
+        else:
+            readings.append(None)
+    return tuple(readings)
+
+
+def _window_percent(limit: Any, used: Any) -> Optional[float]:
+    try:
+        return (int(used) / int(limit)) * 100 if int(limit) else None
+    except (TypeError, ValueError, ZeroDivisionError):
+        return None
+
+
+def _cached_format(formatter: Any, *key: Any) -> str:
+    """Call an lru-cached formatter, bypassing the cache when stored metrics hold unhashable values."""
+    try:
+        return formatter(*key)
+    except TypeError:
+        return formatter.__wrapped__(*key)
+
+
+@functools.lru_cache(maxsize=512, typed=True)
+def _usage_summary_text(total_tokens: Any, last_tokens: Any, readings: Tuple[_WindowReading, ...]) -> str:
+    summary_parts = []
+    if total_tokens is not None:
+        summary_parts.append(f"Total tokens used: {total_tokens}.")
+    if last_tokens is not None:
+        summary_parts.append(f"Last task consumed approximately {last_tokens} tokens.")
+
+    for (_, label), reading in zip(_WINDOW_LABELS, readings):
+        if reading is None:
+            continue
+        limit, used, remaining = reading
+        if limit and used:
+            percent = _window_percent(limit, used)
+            if percent is not None:
+                remaining_text = f", {int(remaining)} remaining" if remaining is not None else ""
+                summary_parts.append(
+                    f"{label} window usage: {int(used)} of {int(limit)} tokens "
+                    f"({percent:.1f}% used{remaining_text})."
+                )
+        elif used:
+            summary_parts.append(f"{label} window usage: {int(used)} tokens consumed.")
+
+    if not summary_parts:
+        return "I do not have token utilization metrics for this session yet."
+    return " ".join(summary_parts)
+
+
+@functools.lru_cache(maxsize=512)
+def _rate_limit_status_text(readings: Tuple[_WindowReading, ...]) -> str:
+    lines = []
+    for (_, label), reading in zip(_WINDOW_LABELS, readings):
+        if reading is not None:
+            limit, used, remaining = reading
+            percent = _window_percent(limit, used) if limit and used else None
+            if percent is not None:
+                remaining_text = f" with {int(remaining)} tokens remaining" if remaining is not None else ""
+                lines.append(
+                    f"{label.capitalize()} window usage is at {percent:.1f}% "
+                    f"({int(used)} of {int(limit)} tokens used{remaining_text})."
+                )
+                continue
+        lines.append(f"{label.capitalize()} utilization details are not available yet.")
+    if not lines:
+        return "I do not have rate limit information for this session."
+    return " ".join(lines)
+
 
 class SessionMetricsMixin:
     """Provides shared helpers for Codex session metrics and rate-limit tracking."""
 
+    @staticmethod
+    def _dig(data: Any, *keys: str, default: Any = None) -> Any:
+        """Walk nested dicts along ``keys``; return ``default`` when a level is missing or not a dict."""
+        for key in keys:
+            if not isinstance(data, dict):
+                return default
+            data = data.get(key)
+            if data is None:
+                return default
+        return data
+
     def _estimate_tokens(self, *texts: Optional[str]) -> int:
-        combined = " ".join(text for text in texts if text)
-        if not combined:
-            return 0
-        estimated = math.ceil(len(combined) / 4)
-        return max(int(estimated), 0)
+        """Approximate the token count as one token per four characters, rounded up."""
+        total_length = sum(len(text) for text in texts if text)
+        return (total_length + 3) // 4
 
     def _to_plain_dict(self, value: Any) -> Optional[Dict[str, Any]]:
         if value is None:
             return None
         if isinstance(value, dict):
             return value
-        for converter in ("model_dump", "dict", "to_dict"):
+        # Pydantic models are the common case; try them before the generic converter cascade.
+        model_dump = getattr(value, "model_dump", None)
+        if callable(model_dump):
+            try:
+                plain = model_dump()
+            except Exception:
+                plain = None
+            if isinstance(plain, dict):
+                return plain
+        for converter in ("dict", "to_dict"):
             method = getattr(value, converter, None)
             if callable(method):
                 try:
@@ -42,44 +166,103 @@ class SessionMetricsMixin:
                 return simplified
         return None
 
-    def _merge_dicts(self, base: Dict[str, Any], updates: Dict[str, Any]) -> Dict[str, Any]:
-        merged = dict(base)
-        for key, value in updates.items():
-            if (
-                key in merged
-                and isinstance(merged[key], dict)
-                and isinstance(value, dict)
-            ):
-                merged[key] = self._merge_dicts(merged[key], value)
-            else:
-                merged[key] = value
-        return merged
-
-    def _flatten_numeric_entries(self, data: Any, prefix: str = "") -> List[Tuple[str, float]]:
+    def _merge_into(self, target: Dict[str, Any], updates: Dict[str, Any]) -> Dict[str, Any]:
+        """Deep-merge ``updates`` into ``target`` in place and return ``target``.
+
+        Nested dicts from ``updates`` are copied into fresh dicts, so later merges never
+        mutate the caller's payloads.
+        """
+        pending: List[Tuple[Dict[str, Any], Dict[str, Any]]] = [(target, updates)]
+        while pending:
+            destination, source = pending.pop()
+            for key, value in source.items():
+                if isinstance(value, dict):
+                    existing = destination.get(key)
+                    if not isinstance(existing, dict):
+                        existing = {}
+                        destination[key] = existing
+                    pending.append((existing, value))
+                else:
+                    destination[key] = value
+        return target
+
+    def _flatten_numeric_entries(self, data: Any) -> List[Tuple[str, float]]:
+        """Collect ``(path, value)`` pairs for every numeric leaf, in depth-first order."""
         entries: List[Tuple[str, float]] = []
-        if isinstance(data, dict):
-            for key, value in data.items():
-                path = f"{prefix}.{key}" if prefix else str(key)
-                entries.extend(self._flatten_numeric_entries(value, path))
-        elif isinstance(data, (list, tuple)):
-            for index, item in enumerate(data):
-                path = f"{prefix}[{index}]" if prefix else f"[{index}]"
-                entries.extend(self._flatten_numeric_entries(item, path))
-        elif isinstance(data, (int, float)):
-            entries.append((prefix, float(data)))
+        stack: List[Tuple[str, Any]] = [("", data)]
+        while stack:
+            prefix, node = stack.pop()
+            if isinstance(node, dict):
+                children = [
+                    (f"{prefix}.{key}" if prefix else str(key), value)
+                    for key, value in node.items()
+                ]
+            elif isinstance(node, (list, tuple)):
+                children = [
+                    (f"{prefix}[{index}]", item)
+                    for index, item in enumerate(node)
+                ]
+            else:
+                if isinstance(node, (int, float)):
+                    entries.append((prefix, float(node)))
+                continue
+            children.reverse()
+            stack.extend(children)
         return entries
 
-    def _find_numeric_by_terms(
+    def _match_usage_terms(self, entries: List[Tuple[str, float]]) -> Dict[str, float]:
+        """Resolve every usage metric in a single pass over the flattened entries.
+
+        For each metric the earliest-listed term set wins; ties go to the first matching path.
+        """
+        best: Dict[str, Tuple[int, float]] = {}
+        for path, value in entries:
+            path_lower = path.lower()
+            for metric_key, term_sets in _USAGE_METRIC_TERMS:
+                current = best.get(metric_key)
+                for rank in range(current[0] if current else len(term_sets)):
+                    if all(term in path_lower for term in term_sets[rank]):
+                        best[metric_key] = (rank, value)
+                        break
+        return {metric_key: value for metric_key, (_, value) in best.items()}
+
+    def _extract_flat_usage_metrics(
         self,
-        entries: List[Tuple[str, float]],
-        term_sets: List[Tuple[str, ...]],
-    ) -> Optional[float]:
-        for terms in term_sets:
-            for path, value in entries:
-                path_lower = path.lower()
-                if all(term in path_lower for term in terms):
-                    return value
-        return None
+        codex_result: Any,
+        prompt: str,
+        output_text: str,
+    ) -> Optional[Dict[str, Any]]:
+        """Read metrics straight from a flat ``usage`` payload.
+
+        Returns None when the result carries anything else, so the generic extractor runs instead.
+        """
+        stats: Dict[str, int] = getattr(self, "_usage_fast_path_stats", None) or {"hits": 0, "misses": 0}
+        setattr(self, "_usage_fast_path_stats", stats)
+
+        usage = None
+        if all(
+            getattr(codex_result, attr_name, None) is None
+            for attr_name in _USAGE_PAYLOAD_ATTRIBUTES
+            if attr_name != "usage"
+        ):
+            usage = self._to_plain_dict(getattr(codex_result, "usage", None))
+        if (
+            not usage
+            or not _FLAT_USAGE_KEYS.issuperset(usage)
+            or not all(isinstance(value, (int, float)) for value in usage.values())
+        ):
+            stats["misses"] += 1
+            logger.debug("Usage metrics fast path missed (%d hits, %d misses).", stats["hits"], stats["misses"])
+            return None
+        stats["hits"] += 1
+
+        delta_tokens = self._estimate_tokens(prompt, output_text)
+        total_tokens = usage.get("total_tokens")
+        return {
+            "total_tokens": int(float(total_tokens)) if total_tokens is not None else delta_tokens,
+            "raw_snapshot": dict(usage),
+            "delta_tokens": delta_tokens,
+        }
 
     def _extract_usage_metrics(
         self,
@@ -87,86 +270,38 @@ class SessionMetricsMixin:
         prompt: str,
         output_text: str,
     ) -> Dict[str, Any]:
+        metrics = self._extract_flat_usage_metrics(codex_result, prompt, output_text)
+        if metrics is not None:
+            return metrics
+
         payloads: List[Dict[str, Any]] = []
         rate_limits_payload: Dict[str, Any] = {}
 
-        for attr_name in ("metrics", "usage", "usage_metrics", "token_usage", "rate_limits", "metadata"):
+        for attr_name in _USAGE_PAYLOAD_ATTRIBUTES:
             attr = getattr(codex_result, attr_name, None)
             plain = self._to_plain_dict(attr)
             if plain:
                 payloads.append(plain)
                 if attr_name == "rate_limits":
-                    rate_limits_payload = self._merge_dicts(rate_limits_payload, plain)
+                    self._merge_into(rate_limits_payload, plain)
 
         combined: Dict[str, Any] = {}
         for payload in payloads:
-            combined = self._merge_dicts(combined, payload)
+            self._merge_into(combined, payload)
 
         flat_entries = self._flatten_numeric_entries(combined)
 
-        total_tokens = self._find_numeric_by_terms(
-            flat_entries,
-            [
-                ("total", "token"),
-                ("token", "total"),
-            ],
-        )
-        delta_tokens = self._find_numeric_by_terms(
-            flat_entries,
-            [
-                ("delta", "token"),
-                ("token", "delta"),
-                ("tokens", "used"),
-                ("used", "token"),
-            ],
-        )
-        five_hour_used = self._find_numeric_by_terms(
-            flat_entries,
-            [
-                ("five", "hour", "used"),
-                ("5", "hour", "used"),
-                ("five-hour", "used"),
-            ],
-        )
-        five_hour_limit = self._find_numeric_by_terms(
-            flat_entries,
-            [
-                ("five", "hour", "limit"),
-                ("5", "hour", "limit"),
-                ("five-hour", "limit"),
-            ],
-        )
-        five_hour_remaining = self._find_numeric_by_terms(
-            flat_entries,
-            [
-                ("five", "hour", "remaining"),
-                ("5", "hour", "remaining"),
-                ("five-hour", "remaining"),
-            ],
-        )
-        weekly_used = self._find_numeric_by_terms(
-            flat_entries,
-            [
-                ("week", "used"),
-                ("weekly", "used"),
-            ],
-        )
-        weekly_limit = self._find_numeric_by_terms(
-            flat_entries,
-            [
-                ("week", "limit"),
-                ("weekly", "limit"),
-            ],
-        )
-        weekly_remaining = self._find_numeric_by_terms(
-            flat_entries,
-            [
-                ("week", "remaining"),
-                ("weekly", "remaining"),
-            ],
-        )
-
-        metrics: Dict[str, Any] = {}
+        matched = self._match_usage_terms(flat_entries)
+        total_tokens = matched.get("total_tokens")
+        delta_tokens = matched.get("delta_tokens")
+        five_hour_used = matched.get("five_hour_used")
+        five_hour_limit = matched.get("five_hour_limit")
+        five_hour_remaining = matched.get("five_hour_remaining")
+        weekly_used = matched.get("weekly_used")
+        weekly_limit = matched.get("weekly_limit")
+        weekly_remaining = matched.get("weekly_remaining")
+
+        metrics = {}
         if total_tokens is not None:
             metrics["total_tokens"] = int(total_tokens)
         if delta_tokens is not None:
@@ -206,15 +341,48 @@ class SessionMetricsMixin:
 
         return metrics
 
+    def _merge_window(self, window_existing: Any, window_extracted: Any, delta_tokens: int) -> Optional[Dict[str, Any]]:
+        """Overlay a turn's reported window values on the stored window; None when nothing changes.
+
+        Without a reported ``used`` value, the stored count is advanced by ``delta_tokens``.
+        """
+        if not isinstance(window_existing, dict):
+            window_existing = {}
+        if not isinstance(window_extracted, dict):
+            window_extracted = {}
+
+        merged_window = dict(window_existing)
+        changed = False
+        for field in _WINDOW_FIELDS:
+            field_value = window_extracted.get(field)
+            if field_value is not None:
+                merged_window[field] = field_value
+                changed = True
+
+        stored_used = window_existing.get("used")
+        if window_extracted.get("used") is None and stored_used is not None:
+            changed = True
+            try:
+                merged_window["used"] = int(stored_used) + delta_tokens
+            except (TypeError, ValueError):
+                pass
+
+        if not changed:
+            return None
+        merged_window.setdefault("last_updated", self._current_time_iso())
+        return merged_window
+
     def _prepare_metrics_update(
         self,
         session_id: str,
         prompt: str,
         output_text: str,
         codex_result: Any,
+        existing_metrics: Optional[Dict[str, Any]] = None,
     ) -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
         extracted = self._extract_usage_metrics(codex_result, prompt, output_text)
-        existing_metrics = self.session_store.get_metrics(session_id) or {}
+        if existing_metrics is None:
+            existing_metrics = self.session_store.get_metrics(session_id) or {}
         token_usage_existing = existing_metrics.get("token_usage", {})
 
         delta_tokens = extracted.get("delta_tokens")
@@ -244,29 +412,12 @@ class SessionMetricsMixin:
         }
 
         for window_key in ("five_hour", "weekly"):
-            window_existing = token_usage_existing.get(window_key, {}) if isinstance(token_usage_existing, dict) else {}
-            window_extracted = extracted.get(window_key, {})
-            if not isinstance(window_existing, dict):
-                window_existing = {}
-            if not isinstance(window_extracted, dict):
-                window_extracted = {}
-
-            window_update: Dict[str, Any] = {}
-            for field in ("used", "limit", "remaining", "last_updated"):
-                field_value = window_extracted.get(field)
-                if field_value is not None:
-                    window_update[field] = field_value
-
-            if "used" not in window_update and window_existing.get("used") is not None:
-                try:
-                    window_update["used"] = int(window_existing.get("used")) + delta_tokens_int
-                except (TypeError, ValueError):
-                    window_update["used"] = window_existing.get("used")
-
-            if window_update:
-                merged_window = dict(window_existing)
-                merged_window.update(window_update)
-                merged_window.setdefault("last_updated", self._current_time_iso())
+            merged_window = self._merge_window(
+                token_usage_existing.get(window_key) if isinstance(token_usage_existing, dict) else None,
+                extracted.get(window_key),
+                delta_tokens_int,
+            )
+            if merged_window is not None:
                 token_usage_update[window_key] = merged_window
 
         metrics_update: Dict[str, Any] = {
@@ -274,12 +425,16 @@ class SessionMetricsMixin:
             "last_task_tokens": delta_tokens_int,
         }
 
+        # Payloads identical to what the session already stores are left out, so stable
+        # rate limits are not merged again or copied into every activity entry.
         rate_limits = extracted.get("rate_limits")
-        if isinstance(rate_limits, dict) and rate_limits:
+        if not isinstance(rate_limits, dict) or rate_limits == existing_metrics.get("rate_limits"):
+            rate_limits = None
+        if rate_limits:
             metrics_update["rate_limits"] = rate_limits
 
         raw_snapshot = extracted.get("raw_snapshot")
-        if isinstance(raw_snapshot, dict) and raw_snapshot:
+        if isinstance(raw_snapshot, dict) and raw_snapshot and raw_snapshot != existing_metrics.get("last_snapshot"):
             metrics_update["last_snapshot"] = raw_snapshot
 
         entry_extra: Dict[str, Any] = {
@@ -290,37 +445,35 @@ class SessionMetricsMixin:
 
         return metrics_update, entry_extra
 
-    def _refresh_warning_cache(self, session_id: str) -> None:
-        record = self._get_session_record(session_id)
+    def _warning_levels_from_record(self, record: Optional[Any]) -> Dict[str, Set[int]]:
+        """Return the warning levels persisted on a session record, as one set per window."""
+        warnings = self._dig(record.metadata, "metrics", "token_usage", "warnings") if record else None
+        if not isinstance(warnings, dict):
+            warnings = {}
+        return {window_key: set(warnings.get(window_key, [])) for window_key in ("five_hour", "weekly")}
+
+    def _refresh_warning_cache(self, session_id: str, record: Optional[Any] = None) -> None:
+        if record is None:
+            record = self._get_session_record(session_id)
         if not record:
             return
-        warnings = (
-            record.metadata.get("metrics", {})
-            .get("token_usage", {})
-            .get("warnings", {})
-        )
-        if isinstance(warnings, dict):
-            self.rate_limit_warning_cache[session_id] = {
-                "five_hour": list(warnings.get("five_hour", [])),
-                "weekly": list(warnings.get("weekly", [])),
-            }
+        self.rate_limit_warning_cache[session_id] = self._warning_levels_from_record(record)
 
-    def _maybe_emit_usage_warnings(self, session_id: str) -> Optional[str]:
-        record = self._get_session_record(session_id)
-        if not record:
-            return None
-        token_usage = (
-            record.metadata.get("metrics", {})
-            .get("token_usage", {})
-        )
-        if not isinstance(token_usage, dict):
-            return None
+    def _compute_new_warnings(
+        self,
+        session_id: str,
+        token_usage: Dict[str, Any],
+    ) -> Tuple[List[Tuple[str, int]], Optional[str]]:
+        """Return newly crossed ``(window, threshold)`` levels and the message announcing them.
 
+        Only the in-memory warning cache is updated; persisting the levels is left to the caller.
+        """
         warnings_cache = self.rate_limit_warning_cache.setdefault(
             session_id,
-            {"five_hour": [], "weekly": []},
+            {"five_hour": set(), "weekly": set()},
         )
 
+        new_levels: List[Tuple[str, int]] = []
         messages: List[str] = []
         for window_key, label in (("five_hour", "5-hour"), ("weekly", "weekly")):
             window_data = token_usage.get(window_key, {})
@@ -340,127 +493,102 @@ class SessionMetricsMixin:
                 continue
 
             percent = (used_int / limit_int) * 100
-            triggered_levels = warnings_cache.setdefault(window_key, [])
-
-            for threshold in self.utilization_warning_thresholds:
-                if percent >= threshold and threshold not in triggered_levels:
-                    try:
-                        self.session_store.record_usage_warning(session_id, window_key, threshold)
-                    except Exception as error:
-                        logger.exception(
-                            "Failed to persist usage warning %s%% for %s: %s",
-                            threshold,
-                            window_key,
-                            error,
-                        )
-                    triggered_levels.append(threshold)
-                    messages.append(
-                        f"Warning: Codex {label} token usage reached {percent:.1f}% "
-                        f"({used_int} of {limit_int} tokens)."
-                    )
-                    break
-
-        if messages:
-            return " ".join(messages)
-        return None
+            triggered_levels = warnings_cache.setdefault(window_key, set())
+            crossed = [
+                threshold
+                for threshold in self.utilization_warning_thresholds
+                if threshold <= percent and threshold not in triggered_levels
+            ]
+            if not crossed:
+                continue
 
-    def _format_usage_summary(self, metrics: Dict[str, Any]) -> str:
-        token_usage = metrics.get("token_usage", {}) if isinstance(metrics, dict) else {}
-        total_tokens = token_usage.get("total_tokens")
-        summary_parts = []
-        if total_tokens is not None:
-            summary_parts.append(f"Total tokens used: {total_tokens}.")
-        last_tokens = metrics.get("last_task_tokens")
-        if last_tokens is not None:
-            summary_parts.append(f"Last task consumed approximately {last_tokens} tokens.")
+            # Thresholds are sorted, so one warning covers every level crossed since the last turn.
+            triggered_levels.update(crossed)
+            new_levels.extend((window_key, threshold) for threshold in crossed)
+            messages.append(
+                f"Warning: Codex {label} token usage reached {percent:.1f}% "
+                f"({used_int} of {limit_int} tokens)."
+            )
 
-        for window_key, label in (("five_hour", "5-hour"), ("weekly", "weekly")):
-            window = token_usage.get(window_key, {})
-            if not isinstance(window, dict):
-                continue
-            limit = window.get("limit")
-            used = window.get("used")
-            remaining = window.get("remaining")
-            if limit and used:
-                try:
-                    percent = (int(used) / int(limit)) * 100 if int(limit) else None
-                except (TypeError, ValueError, ZeroDivisionError):
-                    percent = None
-                if percent is not None:
-                    remaining_text = f", {int(remaining)} remaining" if remaining is not None else ""
-                    summary_parts.append(
-                        f"{label} window usage: {int(used)} of {int(limit)} tokens "
-                        f"({percent:.1f}% used{remaining_text})."
-                    )
-            elif used:
-                summary_parts.append(f"{label} window usage: {int(used)} tokens consumed.")
-
-        if not summary_parts:
-            return "I do not have token utilization metrics for this session yet."
-        return " ".join(summary_parts)
+        return new_levels, " ".join(messages) if messages else None
+
+    def _format_usage_summary(self, metrics: Dict[str, Any]) -> str:
+        token_usage = self._dig(metrics, "token_usage", default=_EMPTY)
+        last_tokens = metrics.get("last_task_tokens") if isinstance(metrics, dict) else None
+        return _cached_format(
+            _usage_summary_text,
+            token_usage.get("total_tokens"),
+            last_tokens,
+            _window_readings(token_usage),
+        )
 
     def _format_rate_limit_status(self, metrics: Dict[str, Any]) -> str:
-        token_usage = metrics.get("token_usage", {}) if isinstance(metrics, dict) else {}
-        lines = []
-        for window_key, label in (("five_hour", "5-hour"), ("weekly", "weekly")):
-            window = token_usage.get(window_key, {})
-            if not isinstance(window, dict):
-                lines.append(f"{label.capitalize()} utilization details are not available yet.")
-                continue
-            limit = window.get("limit")
-            used = window.get("used")
-            remaining = window.get("remaining")
-            if limit and used:
-                try:
-                    percent = (int(used) / int(limit)) * 100 if int(limit) else None
-                except (TypeError, ValueError, ZeroDivisionError):
-                    percent = None
-                if percent is not None:
-                    remaining_text = f" with {int(remaining)} tokens remaining" if remaining is not None else ""
-                    lines.append(
-                        f"{label.capitalize()} window usage is at {percent:.1f}% "
-                        f"({int(used)} of {int(limit)} tokens used{remaining_text})."
-                    )
-                    continue
-            lines.append(f"{label.capitalize()} utilization details are not available yet.")
-        if not lines:
-            return "I do not have rate limit information for this session."
-        return " ".join(lines)
+        token_usage = self._dig(metrics, "token_usage", default=_EMPTY)
+        return _cached_format(_rate_limit_status_text, _window_readings(token_usage))
 
-    def _post_process_codex_activity(
+    async def _post_process_codex_activity(
         self,
+        session_id: str,
         prompt: str,
         output_text: str,
         codex_result: Any,
         entry_type: str = "task",
     ) -> Optional[str]:
-        session_id = self._current_session_id() if hasattr(self, "_current_session_id") else None
-        if not session_id:
-            return None
+        """Persist one Codex turn for ``session_id``; only the store write leaves the event loop."""
+
+        # Metrics written by the previous turn are reused until another store write touches them;
+        # the warning cache is already in step with them in that case.
+        metrics_version = self.session_store.metrics_version(session_id)
+        cached_metrics = self.session_metrics_cache.get(session_id)
+        if cached_metrics is not None and cached_metrics[0] == metrics_version:
+            existing_metrics = cached_metrics[1]
+        else:
+            record = self._get_session_record(session_id)
+            existing_metrics = record.metadata.get("metrics", {}) if record else {}
+            if not isinstance(existing_metrics, dict):
+                existing_metrics = {}
+            self._refresh_warning_cache(session_id, record)
 
         try:
-            metrics_update, entry_extra = self._prepare_metrics_update(session_id, prompt, output_text, codex_result)
+            metrics_update, entry_extra = self._prepare_metrics_update(
+                session_id,
+                prompt,
+                output_text,
+                codex_result,
+                existing_metrics,
+            )
         except Exception as error:
             logger.exception("Failed to prepare metrics update for session %s: %s", session_id, error)
             metrics_update = None
             entry_extra = None
 
+        # Window entries in the update already carry the merged values, so a shallow
+        # overlay gives the token usage the store will hold after this turn.
+        token_usage = existing_metrics.get("token_usage", {})
+        token_usage = dict(token_usage) if isinstance(token_usage, dict) else {}
         if metrics_update:
-            try:
-                self.session_store.update_metrics(session_id, metrics_update)
-            except Exception as error:
-                logger.exception("Failed to update metrics for session %s: %s", session_id, error)
+            token_usage.update(metrics_update.get("token_usage", {}))
+
+        usage_warnings, warning_message = self._compute_new_warnings(session_id, token_usage)
 
         try:
-            self.session_store.append_entry(
+            stored_metrics = await asyncio.to_thread(
+                self.session_store.apply_turn,
                 session_id,
                 prompt=prompt,
                 result=output_text,
                 entry_type=entry_type,
                 extra=entry_extra,
+                metrics_update=metrics_update,
+                usage_warnings=usage_warnings,
             )
         except Exception as error:
             logger.exception("Failed to persist Codex activity for session %s: %s", session_id, error)
+            self.session_metrics_cache.pop(session_id, None)
+        else:
+            self.session_metrics_cache[session_id] = (
+                self.session_store.metrics_version(session_id),
+                stored_metrics,
+            )
 
-        self._refresh_warning_cache(session_id)
-        return self._maybe_emit_usage_warnings(session_id)
+        return warning_message
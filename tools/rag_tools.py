@@ -9,6 +9,8 @@ from livekit.agents import RunContext, function_tool
 from langchain_core.documents import Document
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
+from belya_agents.shared import handle_tool_errors
+
 
 logger = logging.getLogger(__name__)
 
@@ -187,12 +189,9 @@ class RAGFunctionToolsMixin:
         return "\n".join(lines)
 
     @function_tool
+    @handle_tool_errors("researching the repository")
     async def research_repository(self, question: str, run_ctx: RunContext, max_snippets: int = 5) -> str:
         """Search the local repository with a lightweight RAG pipeline and summarize relevant snippets."""
-        try:
-            documents = self._rag_documents()
-            ranked = self._rag_rank_documents(question, documents, max(1, min(max_snippets, 8)))
-            return self._rag_build_response(question, ranked)
-        except Exception as error:  # pragma: no cover - handled through shared helper
-            return self._handle_tool_error("researching the repository", error)
-
+        documents = self._rag_documents()
+        ranked = self._rag_rank_documents(question, documents, max(1, min(max_snippets, 8)))
+        return self._rag_build_response(question, ranked)